@@ -0,0 +1,509 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Benchmarks of the library's own overhead
+
+Polly is replaced by FakePollyClient, which answers with synthetic audio of a configurable size after a
+configurable latency, so the benchmarks run offline and without AWS credentials. Results are printed as JSON so
+runs of different versions can be compared.
+
+python Benchmark.py all --output current.json
+python Benchmark.py all --compare baseline.json
+
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+import uuid
+
+from botocore.response import StreamingBody
+
+from __init__ import PollyTTS
+from Scheduler import Scheduler
+from Voices import Voices
+from Ssml import TAG_REPLACEMENTS, MEMOIZE_MAX_CHARS, text_to_ssml, _text_to_ssml
+
+WORDS = ['polly', 'speech', 'voice', 'the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', '1234', 'call',
+         'me', 'at', 'tomorrow.', 'hello,', 'world!']
+
+
+def legacy_text_to_ssml(text):
+    """
+    Tag conversion as implemented before the single pass translator, one str.replace per tag
+    """
+    text = text.strip()
+    for k, v in TAG_REPLACEMENTS.items():
+        if k in text:
+            text = text.replace(k, v)
+    return '<speak>' + text + '</speak>'
+
+
+def sample_text(size, seed=0):
+    """
+    Text of about size characters with speak tags spread through it
+    @param size: Number of characters
+    @param seed: Random seed, the same seed gives the same text
+    @return: Text
+    """
+    generator = random.Random(seed)
+    tags = [tag for tag in TAG_REPLACEMENTS if not tag.startswith('</') and tag != '<break>']
+    parts = []
+    length = 0
+    while length < size:
+        if generator.random() < 0.1:
+            tag = generator.choice(tags)
+            part = '{}{}{} '.format(tag, generator.choice(WORDS), tag.replace('<', '</'))
+        elif generator.random() < 0.02:
+            part = '<break> '
+        else:
+            part = generator.choice(WORDS) + ' '
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size]
+
+
+def time_call(function, argument, repeat=5):
+    """
+    Best time of a single call
+    @param function: Callable to time
+    @param argument: Argument passed to the callable
+    @param repeat: Number of measurements
+    @return: Seconds per call
+    """
+    timer = timeit.Timer(lambda: function(argument))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def benchmark_ssml(sizes=(100, 1000, 10000, 100000), repeat=5):
+    """
+    Compare the per tag replacement loop with the single pass translator
+    @param sizes: Input sizes in characters
+    @param repeat: Number of measurements per input
+    @return: List of results per size
+    """
+    results = []
+    for size in sizes:
+        text = sample_text(size)
+        if legacy_text_to_ssml(text) != _text_to_ssml(text):
+            raise AssertionError("Translators disagree for input of {} characters".format(size))
+        result = {
+            'chars': size,
+            'legacy_seconds': time_call(legacy_text_to_ssml, text, repeat),
+            'single_pass_seconds': time_call(_text_to_ssml, text, repeat)
+        }
+        result['speedup'] = result['legacy_seconds'] / result['single_pass_seconds']
+        if size <= MEMOIZE_MAX_CHARS:
+            result['memoized_seconds'] = time_call(text_to_ssml, text, repeat)
+        results.append(result)
+    return results
+
+
+class FakePollyClient:
+    """
+    Stand-in for the Polly client returning synthetic audio.
+
+    The audio starts with the voice and text of the request, so callers can check they received the audio of their
+    own request, and is padded to audio_bytes. Requests for the json output format receive speech marks for every
+    word and SSML mark of the request, spaced MARK_INTERVAL milliseconds apart.
+    """
+
+    MARK_INTERVAL = 250
+
+    def __init__(self, audio_bytes=32 * 1024, latency=0.0, capacity=None):
+        """
+        Initiate class
+        @param audio_bytes: Size of the returned audio in bytes
+        @param latency: Seconds to wait before answering
+        @param capacity: Number of requests answered at the same time, others wait. Default - None (no limit)
+        """
+        self.audio_bytes = audio_bytes
+        self.latency = latency
+        self.calls = 0
+        self._padding = bytes(audio_bytes)
+        self._lock = threading.Lock()
+        self._capacity = threading.BoundedSemaphore(capacity) if capacity else None
+
+    def synthesize_speech(self, **params):
+        with self._lock:
+            self.calls += 1
+        if self._capacity is not None:
+            with self._capacity:
+                time.sleep(self.latency)
+        elif self.latency:
+            time.sleep(self.latency)
+        if params['OutputFormat'] == 'json':
+            marks = self.speech_marks(params['Text'], params['SpeechMarkTypes'])
+            return {
+                'ResponseMetadata': {'HTTPStatusCode': 200, 'RequestId': str(uuid.uuid4())},
+                'ContentType': 'application/x-json-stream',
+                'RequestCharacters': len(params['Text']),
+                'AudioStream': StreamingBody(io.BytesIO(marks), len(marks))
+            }
+        header = '{}|{}|'.format(params['VoiceId'], params['Text']).encode('utf-8')
+        audio = header + memoryview(self._padding)[len(header):]
+        return {
+            'ResponseMetadata': {'HTTPStatusCode': 200, 'RequestId': str(uuid.uuid4())},
+            'ContentType': 'audio/mpeg',
+            'RequestCharacters': len(params['Text']),
+            'AudioStream': StreamingBody(io.BytesIO(audio), len(audio))
+        }
+
+    def speech_marks(self, ssml, mark_types):
+        lines = []
+        position = 0
+        encoded = ssml.encode('utf-8')
+        for match in re.finditer(br'<mark name="([^"]*)"/>|([^<>\s]+)(?![^<]*>)', encoded):
+            if match.group(1) is not None:
+                mark = {'time': position, 'type': 'ssml', 'start': match.start(), 'end': match.end(),
+                        'value': match.group(1).decode('utf-8')}
+            else:
+                mark = {'time': position, 'type': 'word', 'start': match.start(), 'end': match.end(),
+                        'value': match.group(2).decode('utf-8')}
+                position += self.MARK_INTERVAL
+            if mark['type'] in mark_types:
+                lines.append(json.dumps(mark, separators=(',', ':')))
+        return '\n'.join(lines).encode('utf-8') + b'\n'
+
+    def describe_voices(self, **params):
+        if self.latency:
+            time.sleep(self.latency)
+        return {'Voices': []}
+
+
+def fake_polly(audio_bytes=32 * 1024, latency=0.0, **options):
+    """
+    PollyTTS instance backed by a FakePollyClient, with client side rate limiting, caching and coalescing off unless
+    given in options
+    """
+    options.setdefault('rate_limiter', None)
+    options.setdefault('coalesce', False)
+    return PollyTTS('benchmark', 'benchmark', client=FakePollyClient(audio_bytes, latency), **options)
+
+
+def benchmark_overhead(audio_bytes=32 * 1024, repeat=5):
+    """
+    Time per call of the request path with a client answering immediately
+    @param audio_bytes: Size of the synthetic audio
+    @param repeat: Number of measurements
+    @return: Dictionary of seconds per call
+    """
+    polly = fake_polly(audio_bytes)
+    voices = Voices()
+    request = polly.prepare_request('Hello <emphasize>world</emphasize>', lang='en-GB')
+    text = 'Hello <whisper>there</whisper>, how are you today?'
+
+    def consume_stream(value):
+        for _ in polly.stream(value):
+            pass
+
+    return {
+        'audio_bytes': audio_bytes,
+        'voices_get_language_details_seconds': time_call(voices.get_language_details, 'en-US', repeat),
+        'voices_validate_seconds': time_call(lambda lang: voices.validate(lang, 'Joanna', 'neural'), 'en-US',
+                                             repeat),
+        'validate_request_seconds': time_call(polly.validate_request, request, repeat),
+        'convert_text_to_ssml_seconds': time_call(polly.convert_text_to_ssml, text, repeat),
+        'prepare_request_seconds': time_call(polly.prepare_request, text, repeat),
+        'speak_seconds': time_call(polly.speak, text, repeat),
+        'stream_seconds': time_call(consume_stream, text, repeat)
+    }
+
+
+def benchmark_throughput(threads=(1, 4, 16), latency=0.02, audio_bytes=32 * 1024, requests_per_thread=50):
+    """
+    Requests per second of one shared PollyTTS instance used by many threads.
+    Every response is checked against its request, a non zero mismatch count means requests interfered.
+    @param threads: Thread counts to measure
+    @param latency: Simulated Polly latency in seconds
+    @param audio_bytes: Size of the synthetic audio
+    @param requests_per_thread: Requests sent by each thread
+    @return: List of results per thread count
+    """
+    results = []
+    for count in threads:
+        polly = fake_polly(audio_bytes, latency, max_workers=count)
+        combinations = [('en-US', 'Joanna'), ('en-US', 'Matthew'), ('en-GB', 'Brian'), ('fr-FR', 'Celine'),
+                        ('de-DE', 'Hans')]
+        combinations = [(lang, voice) for lang, voice in combinations
+                        if voice in polly.supported_voices.get_language_details(lang).voices]
+        mismatches = []
+
+        def work(worker):
+            for number in range(requests_per_thread):
+                lang, voice = combinations[(worker + number) % len(combinations)]
+                text = 'thread {} request {}'.format(worker, number)
+                audio = polly.speak(text, lang=lang, voice=voice)
+                if not audio.startswith('{}|<speak>{}</speak>|'.format(voice, text).encode('utf-8')):
+                    mismatches.append(text)
+
+        workers = [threading.Thread(target=work, args=(worker,)) for worker in range(count)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        requests = count * requests_per_thread
+        results.append({
+            'threads': count,
+            'latency_seconds': latency,
+            'requests': requests,
+            'requests_per_second': requests / elapsed,
+            'efficiency': (requests / elapsed) / (count / latency) if latency else None,
+            'mismatches': len(mismatches)
+        })
+    return results
+
+
+def benchmark_memory(audio_sizes=(32 * 1024, 1024 * 1024), requests=20):
+    """
+    Memory allocated per speak call
+    @param audio_sizes: Sizes of the synthetic audio
+    @param requests: Number of calls measured per size
+    @return: List of results per audio size
+    """
+    results = []
+    for audio_bytes in audio_sizes:
+        polly = fake_polly(audio_bytes)
+        polly.speak('warm up')
+        peaks = []
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            for number in range(requests):
+                tracemalloc.reset_peak()
+                start = tracemalloc.get_traced_memory()[0]
+                audio = polly.speak('memory request {}'.format(number))
+                peaks.append(tracemalloc.get_traced_memory()[1] - start)
+                del audio
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+        results.append({
+            'audio_bytes': audio_bytes,
+            'peak_bytes_per_request': sum(peaks) / len(peaks),
+            'peak_to_audio_ratio': (sum(peaks) / len(peaks)) / audio_bytes,
+            'retained_bytes_per_request': retained / requests
+        })
+    return results
+
+
+def benchmark_packing(texts=400, latency=0.02, threads=10):
+    """
+    Short prompts synthesized one request each with speak_many against packed with speak_packed
+    @param texts: Number of prompts
+    @param latency: Simulated Polly latency in seconds
+    @param threads: Requests in flight
+    @return: Dictionary of requests sent and seconds taken by both
+    """
+    prompts = ['short prompt number {}'.format(number) for number in range(texts)]
+    polly = fake_polly(4 * 1024, latency, max_workers=threads)
+
+    started = time.perf_counter()
+    polly.speak_many([{'text': prompt, 'output_format': 'pcm'} for prompt in prompts])
+    separate_seconds = time.perf_counter() - started
+    separate_requests = polly.client.calls
+
+    polly.client.calls = 0
+    started = time.perf_counter()
+    polly.speak_packed(prompts)
+    packed_seconds = time.perf_counter() - started
+
+    return {
+        'texts': texts,
+        'latency_seconds': latency,
+        'separate_requests': separate_requests,
+        'separate_seconds': separate_seconds,
+        'packed_requests': polly.client.calls,
+        'packed_seconds': packed_seconds,
+        'speedup': separate_seconds / packed_seconds
+    }
+
+
+def benchmark_priority(bulk_requests=600, interactive_requests=30, latency=0.02, capacity=4):
+    """
+    Latency of interactive requests made while a bulk batch saturates Polly, with and without a scheduler
+    @param bulk_requests: Size of the bulk batch
+    @param interactive_requests: Interactive requests made one after the other during the batch
+    @param latency: Simulated Polly latency in seconds
+    @param capacity: Requests Polly answers at the same time
+    @return: Dictionary of median and maximum interactive latencies in seconds with and without the scheduler
+    """
+    results = {}
+    for name, scheduler in (('unscheduled', None), ('scheduled', Scheduler(capacity, limits={'bulk': capacity - 1}))):
+        client = FakePollyClient(4 * 1024, latency, capacity)
+        options = dict(client=client, rate_limiter=None, coalesce=False, scheduler=scheduler, max_workers=32)
+        bulk = PollyTTS('benchmark', 'benchmark', priority='bulk', tenant='batch', **options)
+        interactive = PollyTTS('benchmark', 'benchmark', priority='interactive', **options)
+
+        batch = threading.Thread(target=bulk.speak_many,
+                                 args=([{'text': 'bulk prompt {}'.format(number)} for number in range(bulk_requests)],))
+        batch.start()
+        time.sleep(latency)
+        latencies = []
+        for number in range(interactive_requests):
+            started = time.perf_counter()
+            interactive.speak('interactive prompt {}'.format(number))
+            latencies.append(time.perf_counter() - started)
+        batch.join()
+        latencies.sort()
+        results[name] = {
+            'median_seconds': latencies[len(latencies) // 2],
+            'max_seconds': latencies[-1]
+        }
+    return results
+
+
+# Modules the library must not load before they are needed, each takes tens to hundreds of milliseconds to import
+LAZY_MODULES = ('boto3', 'botocore', 'numpy', 'asyncio', 'concurrent.futures')
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from __init__ import PollyTTS
+imported = time.perf_counter()
+polly = PollyTTS('benchmark', 'benchmark', client_registry=None, rate_limiter=None)
+try:
+    polly.prepare_request('hello', lang='xx-XX')
+except Exception:
+    pass
+constructed = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'construct_seconds': constructed - imported,
+    'loaded': [name for name in sys.argv[1:] if name in sys.modules]
+}))
+'''
+
+
+def benchmark_import(repeat=5):
+    """
+    Cold import and construction time of PollyTTS, each measured in a new interpreter
+    @param repeat: Number of interpreters started
+    @return: Dictionary of the fastest import and construction times, and the modules among LAZY_MODULES loaded by
+    importing the library, constructing an instance and rejecting an invalid request
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT] + list(LAZY_MODULES), cwd=directory,
+                                check=True, stdout=subprocess.PIPE).stdout
+        runs.append(json.loads(output))
+    return {
+        'import_seconds': min(run['import_seconds'] for run in runs),
+        'construct_seconds': min(run['construct_seconds'] for run in runs),
+        'eagerly_loaded': sorted(set(name for run in runs for name in run['loaded']))
+    }
+
+
+def compare(current, baseline, path=''):
+    """
+    Ratios of numeric results to a baseline report
+    @param current: Current report
+    @param baseline: Baseline report
+    @param path: Prefix of the result names
+    @return: Dictionary mapping result names to current / baseline
+    """
+    ratios = {}
+    if isinstance(current, dict) and isinstance(baseline, dict):
+        for name in current:
+            if name in baseline:
+                ratios.update(compare(current[name], baseline[name], '{}.{}'.format(path, name).strip('.')))
+    elif isinstance(current, list) and isinstance(baseline, list):
+        for position, (value, base) in enumerate(zip(current, baseline)):
+            ratios.update(compare(value, base, '{}[{}]'.format(path, position)))
+    elif isinstance(current, (int, float)) and isinstance(baseline, (int, float)) \
+            and not isinstance(current, bool) and baseline:
+        ratios[path] = current / baseline
+    return ratios
+
+
+# Benchmarks run by all, in order
+BENCHMARKS = ('ssml', 'overhead', 'throughput', 'memory', 'packing', 'priority', 'import')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark pollytts overhead against a fake Polly client')
+    parser.add_argument('benchmark', choices=BENCHMARKS + ('all',))
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per timed call')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16], help='thread counts for throughput')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated Polly latency in seconds')
+    parser.add_argument('--audio-bytes', type=int, default=32 * 1024, help='size of the synthetic audio')
+    parser.add_argument('--output', help='write the report to this file instead of standard output')
+    parser.add_argument('--compare', help='baseline report to compare the results with')
+    arguments = parser.parse_args(argv)
+
+    selected = BENCHMARKS if arguments.benchmark == 'all' else [arguments.benchmark]
+    report = {'python': sys.version.split()[0]}
+
+    # Keep anything the library prints out of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        if 'ssml' in selected:
+            report['ssml'] = benchmark_ssml(repeat=arguments.repeat)
+        if 'overhead' in selected:
+            report['overhead'] = benchmark_overhead(arguments.audio_bytes, arguments.repeat)
+        if 'throughput' in selected:
+            report['throughput'] = benchmark_throughput(arguments.threads, arguments.latency, arguments.audio_bytes)
+        if 'memory' in selected:
+            report['memory'] = benchmark_memory()
+        if 'packing' in selected:
+            report['packing'] = benchmark_packing(latency=arguments.latency)
+        if 'priority' in selected:
+            report['priority'] = benchmark_priority(latency=arguments.latency)
+        if 'import' in selected:
+            report['import'] = benchmark_import(arguments.repeat)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            report['compared_to'] = compare(report, json.load(file))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    # Loading one of these at import is a regression regardless of the timings
+    if report.get('import', {}).get('eagerly_loaded'):
+        sys.stderr.write('Loaded on import: {}\n'.format(', '.join(report['import']['eagerly_loaded'])))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,373 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Caches for synthesized audio
+
+Polly output is fully determined by the SSML, voice, engine, output format and region of a request, so
+identical requests can be answered locally instead of paying another round trip to the service.
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """
+    Build a content address for a synthesis request
+    @param parts: Request attributes that determine the audio (SSML, voice, engine, output format, region...)
+    @return: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent content addressed audio cache.
+
+    Entries are stored under a sharded directory layout (<directory>/ab/cd/<key>) so no single directory grows
+    too large. Writes go to a temporary file that is atomically renamed into place, so readers never observe a
+    partially written entry. The total size of the cache is bounded by max_bytes, least recently used entries are
+    evicted first. Recency is kept in the file modification time so it survives restarts, and in the order of an
+    in memory index while running.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, shard_depth=2):
+        """
+        Initiate class
+        @param directory: Root directory of the cache. Created if it does not exist
+        @param max_bytes: Maximum total size of cached audio in bytes. Default - 512 MB
+        @param shard_depth: Number of two character directory levels used to shard entries. Default - 2
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.shard_depth = shard_depth
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        """
+        Location of the cache entry for a key
+        @param key: Cache key
+        @return: Absolute path of the entry (which may not exist)
+        """
+        shards = [key[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.directory, *shards, key)
+
+    def get(self, key):
+        """
+        Read a cached entry
+        @param key: Cache key
+        @return: Cached audio bytes, None if the key is not cached
+        """
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            # Evicted by another process between lookup and read
+            self._forget(key)
+            return None
+
+    def get_path(self, key):
+        """
+        Location of a cached entry, marking it as recently used
+        @param key: Cache key
+        @return: Absolute path of the entry, None if the key is not cached
+        """
+        self._load_index()
+        path = self.path_for(key)
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Written by another process sharing the directory
+                size = os.path.getsize(path)
+                self._entries[key] = size
+                self._total_bytes += size
+        return path
+
+    def put(self, key, data):
+        """
+        Atomically store an entry and evict least recently used entries beyond max_bytes
+        @param key: Cache key
+        @param data: Audio bytes
+        @return: Absolute path of the stored entry
+        """
+        return self._store(key, lambda file: file.write(data))
+
+    def put_file(self, key, source):
+        """
+        Atomically store the content of an existing file, copying it in fixed size chunks
+        @param key: Cache key
+        @param source: Path of the audio file to cache
+        @return: Absolute path of the stored entry
+        """
+        def copy(file):
+            with open(source, 'rb') as audio:
+                shutil.copyfileobj(audio, file)
+
+        return self._store(key, copy)
+
+    def tee(self, key, chunks):
+        """
+        Store audio while it is passed on chunk by chunk, e.g. to a caller's file. The entry is stored once every
+        chunk has been read, and discarded if reading stops early or fails.
+        @param key: Cache key
+        @param chunks: Iterable of audio bytes
+        @return: Iterator of the same chunks
+        """
+        self._load_index()
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    yield chunk
+                file.flush()
+                os.fsync(file.fileno())
+                size = file.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._add(key, size)
+
+    def _store(self, key, write):
+        """
+        Write an entry through a temporary file renamed into place
+        @param key: Cache key
+        @param write: Callable writing the entry content to the given binary file object
+        @return: Absolute path of the stored entry
+        """
+        self._load_index()
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                write(file)
+                file.flush()
+                os.fsync(file.fileno())
+                size = file.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._add(key, size)
+        return path
+
+    def _add(self, key, size):
+        """
+        Account for a stored entry and evict least recently used entries beyond max_bytes
+        @return: None
+        """
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+        return None
+
+    def _load_index(self):
+        """
+        Build the in memory size/recency index from the directory on first use
+        @return: None
+        """
+        if self._entries is not None:
+            return None
+
+        found = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.startswith('.tmp-'):
+                    # Left behind by an interrupted write
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+                total += stat.st_size
+
+        # Least recently used first
+        found.sort()
+        entries = OrderedDict((name, size) for _, name, size in found)
+        with self._lock:
+            if self._entries is None:
+                self._entries = entries
+                self._total_bytes = total
+        return None
+
+    def _forget(self, key):
+        with self._lock:
+            if self._entries is None:
+                return
+            self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes
+        @return: None
+        """
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return None
+            victims = []
+            while self._total_bytes > self.max_bytes and self._entries:
+                key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                victims.append(key)
+
+        for key in victims:
+            try:
+                os.unlink(self.path_for(key))
+            except FileNotFoundError:
+                pass
+        return None
+
+
+class MemoryCache:
+    """
+    Process local least recently used audio cache bounded by the total size of the cached audio.
+
+    A single entry can be hundreds of kilobytes, so the budget is expressed in bytes rather than entry count.
+    All operations are guarded by a lock so one instance can be shared by many worker threads.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Initiate class
+        @param max_bytes: Maximum total size of cached audio in bytes. Default - 64 MB
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key):
+        """
+        Read a cached entry, marking it as most recently used
+        @param key: Cache key
+        @return: Cached audio bytes, None if the key is not cached
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """
+        Store an entry and evict least recently used entries beyond max_bytes.
+        Entries larger than the whole budget are not cached.
+        @param key: Cache key
+        @param data: Audio bytes
+        @return: None
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            return None
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._entries[key] = data
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.evictions += 1
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        Cache counters
+        @return: Dictionary of hits, misses, evictions, entries and bytes
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes
+            }
@@ -0,0 +1,138 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Shared boto3 sessions and Polly clients
+
+Creating a session and a client costs tens of milliseconds and every new client opens its own connections. PollyTTS
+instances created with the same credentials, region and connection settings share one client (and its connection
+pool) through a registry.
+
+boto3 is only imported when the first client is created, importing it takes longer than the rest of the library.
+
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ClientRegistry:
+    """
+    Least recently used registry of boto3 sessions and Polly clients.
+
+    Sessions are keyed by credentials, clients by credentials, region and connection settings. When more than
+    max_clients clients are registered, or a client has not been used for idle_timeout seconds, it is dropped from
+    the registry. Instances still holding a dropped client keep working with it.
+    """
+
+    def __init__(self, max_clients=64, idle_timeout=None):
+        """
+        Initiate class
+        @param max_clients: Maximum number of clients kept. Default - 64
+        @param idle_timeout: Seconds after which an unused client is dropped. Default - None (never)
+        """
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def get(self, access_key_id, secret_access_key, region, max_pool_connections=10, connect_timeout=60,
+            read_timeout=60, tcp_keepalive=False, max_attempts=None):
+        """
+        Session and Polly client for a tenant, created on first use
+        @param access_key_id: AWS Polly access key id
+        @param secret_access_key: AWS Polly secret access key
+        @param region: AWS region
+        @param max_pool_connections: Maximum number of connections kept in the client pool
+        @param connect_timeout: Seconds to wait for a connection to be established
+        @param read_timeout: Seconds to wait for data on an established connection
+        @param tcp_keepalive: Enable TCP keepalive on pool connections
+        @param max_attempts: Number of retries made by botocore itself. Default - None (botocore default)
+        @return: Tuple of boto3 session and Polly client
+        """
+        credentials = (access_key_id, hashlib.sha256((secret_access_key or '').encode('utf-8')).hexdigest())
+        key = (credentials, region, max_pool_connections, connect_timeout, read_timeout, tcp_keepalive, max_attempts)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[2] = now
+                self._clients.move_to_end(key)
+                return entry[0], entry[1]
+
+            import boto3 as aws
+            from botocore.config import Config
+
+            session = self._sessions.get((credentials, region))
+            if session is None:
+                session = aws.session.Session(
+                    aws_access_key_id=access_key_id,
+                    aws_secret_access_key=secret_access_key,
+                    region_name=region
+                )
+                self._sessions[(credentials, region)] = session
+
+            options = {
+                'max_pool_connections': max_pool_connections,
+                'connect_timeout': connect_timeout,
+                'read_timeout': read_timeout
+            }
+            if tcp_keepalive:
+                options['tcp_keepalive'] = True
+            if max_attempts is not None:
+                options['retries'] = {'max_attempts': max_attempts}
+            client = session.client('polly', config=Config(**options))
+
+            self._clients[key] = [session, client, now]
+            while len(self._clients) > self.max_clients:
+                self._drop(next(iter(self._clients)))
+            return session, client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._sessions.clear()
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+        for key in [key for key, entry in self._clients.items() if now - entry[2] > self.idle_timeout]:
+            self._drop(key)
+
+    def _drop(self, key):
+        session = self._clients.pop(key)[0]
+        if not any(entry[0] is session for entry in self._clients.values()):
+            self._sessions.pop((key[0], key[1]), None)
+
+
+# Registry shared by all PollyTTS instances unless another one is given
+default_registry = ClientRegistry()
@@ -0,0 +1,272 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Coalescing of identical requests in flight
+
+When many callers ask for the same audio at the same moment only the first one (the leader) calls Polly. The
+others wait for the leader and receive its result, or its exception.
+
+"""
+
+import threading
+import time
+
+from Exceptions import TimeoutException
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """
+    Shares the result of a call between concurrent callers using the same key
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, timeout=None):
+        """
+        Call function, unless a call with the same key is in flight, in which case wait for its result
+        @param key: Hashable identity of the call
+        @param function: Callable without arguments
+        @param timeout: Maximum number of seconds to wait for a call in flight, TimeoutException is raised after.
+        Default - None
+        @return: Result of the call
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutException("Deadline exceeded waiting for an identical request")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight.done.set()
+
+    def stream(self, key, open_stream):
+        """
+        Open a stream, unless a stream with the same key is being read, in which case read along with it.
+        Every caller receives its own reader starting at the first chunk.
+        @param key: Hashable identity of the stream
+        @param open_stream: Callable without arguments returning an iterator of chunks with a close() method
+        @return: SharedStreamReader
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                flight = self._streams.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._streams[key] = _Flight()
+
+            if leader:
+                return self._lead_stream(key, flight, open_stream, started)
+
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.result.join():
+                with self._lock:
+                    self.coalesced += 1
+                return SharedStreamReader(flight.result, started)
+            # The stream finished before this caller could join it, start over
+
+    def _lead_stream(self, key, flight, open_stream, started):
+        def finished():
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+
+        try:
+            flight.result = SharedStream(open_stream(), on_finish=finished)
+            flight.result.join()
+            return SharedStreamReader(flight.result, started)
+        except BaseException as e:
+            flight.error = e
+            finished()
+            raise
+        finally:
+            flight.done.set()
+
+
+class SharedStream:
+    """
+    Source stream read once on behalf of several readers. Chunks are kept so readers joining late start at the
+    beginning. The source is closed when it is exhausted or when every reader has been closed, after which the
+    stream can no longer be joined.
+    """
+
+    def __init__(self, source, on_finish=None):
+        self.source = source
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self._readers = 0
+        self._on_finish = on_finish
+        self._lock = threading.Lock()
+
+    def join(self):
+        """
+        Register a reader
+        @return: False if the stream has already finished
+        """
+        with self._lock:
+            if self.finished:
+                return False
+            self._readers += 1
+            return True
+
+    def leave(self):
+        """
+        Unregister a reader, closing the source when it was the last one
+        @return: None
+        """
+        with self._lock:
+            self._readers -= 1
+            abandoned = self._readers == 0 and not self.finished
+            if abandoned:
+                self.finished = True
+        if abandoned:
+            self.source.close()
+            self._finish()
+        return None
+
+    def chunk(self, position):
+        """
+        Chunk at a position, reading from the source if no reader has read it yet
+        @param position: Index of the chunk
+        @return: Chunk, None when the stream is exhausted
+        """
+        if position < len(self.chunks):
+            return self.chunks[position]
+
+        ended = False
+        with self._lock:
+            while position >= len(self.chunks) and not self.finished:
+                try:
+                    self.chunks.append(next(self.source))
+                except StopIteration:
+                    self.finished = ended = True
+                except BaseException as e:
+                    self.error = e
+                    self.finished = ended = True
+            chunk = self.chunks[position] if position < len(self.chunks) else None
+        if ended:
+            self._finish()
+
+        if chunk is None and self.error is not None:
+            raise self.error
+        return chunk
+
+    def _finish(self):
+        if self._on_finish is not None:
+            self._on_finish()
+
+
+class SharedStreamReader:
+    """
+    Iterator over the chunks of a SharedStream, used like an AudioStream
+    """
+
+    def __init__(self, shared, started=None):
+        self.shared = shared
+        self.started = time.monotonic() if started is None else started
+        self.time_to_first_byte = None
+        self.bytes_read = 0
+        self.closed = False
+        self._position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            chunk = self.shared.chunk(self._position)
+        except BaseException:
+            self.close()
+            raise
+        if chunk is None:
+            self.close()
+            raise StopIteration
+        if self.time_to_first_byte is None:
+            self.time_to_first_byte = time.monotonic() - self.started
+        self._position += 1
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """
+        Stop reading. The source is closed once every reader has stopped.
+        @return: None
+        """
+        if self.closed:
+            return None
+        self.closed = True
+        self.shared.leave()
+        return None
+
+    def write_to(self, file):
+        written = 0
+        for chunk in self:
+            file.write(chunk)
+            written += len(chunk)
+        return written
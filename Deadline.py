@@ -0,0 +1,278 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+
+"""
+
+Deadlines and cancellation of synthesis calls
+
+A Deadline is created once per call and passed down to every step: waiting for the scheduler and the rate limiter,
+backing off between retries, the HTTP call and reading the response body. Each step waits at most for the time
+remaining and raises TimeoutException once it has run out. Response bodies are closed by a watchdog thread when
+the deadline passes, so a read stalled on a silent connection fails at the deadline rather than at the socket read
+timeout.
+
+Cancelling a deadline makes every step stop as if it had expired, which is how cancelled asyncio tasks and
+abandoned batches release their connections.
+
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from Exceptions import TimeoutException
+
+logger = logging.getLogger(__name__)
+
+
+class _Watchdog:
+    """
+    Single thread running callbacks at given times. Entries are lists so they can be disarmed in place.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, when, callback):
+        entry = [when, next(self._sequence), callback]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pollytts-deadlines', daemon=True)
+                self._thread.start()
+            elif self._heap[0] is entry:
+                self._condition.notify()
+        return entry
+
+    @staticmethod
+    def unschedule(entry):
+        # Left in the heap and skipped once it is due
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    while self._heap and self._heap[0][2] is None:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        entry = heapq.heappop(self._heap)
+                        callback, entry[2] = entry[2], None
+                        break
+                    self._condition.wait(delay)
+            if callback is not None:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception('Deadline callback failed')
+
+
+_watchdog = _Watchdog()
+
+
+class Deadline:
+    """
+    Point in time by which a call has to complete, which can also be cancelled
+    """
+
+    __slots__ = ('expires', 'cancelled', '_handles', '_lock')
+
+    def __init__(self, timeout=None):
+        """
+        Initiate class
+        @param timeout: Seconds from now. Default - None (never expires, can still be cancelled)
+        """
+        self.expires = None if timeout is None else time.monotonic() + timeout
+        self.cancelled = False
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'Deadline(remaining={}, cancelled={})'.format(self.remaining(), self.cancelled)
+
+    @classmethod
+    def of(cls, timeout):
+        """
+        Deadline for a timeout argument
+        @param timeout: Seconds, a Deadline or None
+        @return: Deadline, None when timeout is None
+        """
+        if timeout is None or isinstance(timeout, Deadline):
+            return timeout
+        return cls(timeout)
+
+    def remaining(self):
+        """
+        Seconds left, 0 once expired or cancelled, None when the deadline never expires
+        """
+        if self.cancelled:
+            return 0.0
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.cancelled or (self.expires is not None and time.monotonic() >= self.expires)
+
+    def check(self, step):
+        """
+        Raise TimeoutException if the deadline has passed
+        @param step: What the call was doing, for the message
+        @return: None
+        """
+        if self.expired():
+            raise self.exception(step)
+        return None
+
+    def exception(self, step):
+        if self.cancelled:
+            return TimeoutException("Cancelled while {}".format(step))
+        return TimeoutException("Deadline exceeded while {}".format(step))
+
+    def on_expiry(self, callback):
+        """
+        Call a function when the deadline passes or is cancelled
+        @param callback: Callable without arguments, run on the watchdog thread or by cancel
+        @return: Handle for discard
+        """
+        with self._lock:
+            handle = [callback, None]
+            if not self.cancelled:
+                if self.expires is not None:
+                    handle[1] = _watchdog.schedule(self.expires, self._fire(handle))
+                self._handles.append(handle)
+                return handle
+        # Already cancelled
+        callback()
+        return handle
+
+    def discard(self, handle):
+        """
+        Forget a callback registered with on_expiry, once the step it guards has finished
+        @param handle: Handle returned by on_expiry
+        @return: None
+        """
+        with self._lock:
+            handle[0] = None
+            if handle[1] is not None:
+                _watchdog.unschedule(handle[1])
+            try:
+                self._handles.remove(handle)
+            except ValueError:
+                pass
+        return None
+
+    def cancel(self):
+        """
+        Expire the deadline now, running the registered callbacks
+        @return: None
+        """
+        with self._lock:
+            self.cancelled = True
+            handles, self._handles = self._handles, []
+        for handle in handles:
+            if handle[1] is not None:
+                _watchdog.unschedule(handle[1])
+            self._fire(handle)()
+        return None
+
+    @staticmethod
+    def _fire(handle):
+        def fire():
+            callback, handle[0] = handle[0], None
+            if callback is not None:
+                callback()
+        return fire
+
+
+class DeadlineBody:
+    """
+    Response body failing with TimeoutException once its deadline passes, closed by the watchdog if a read is
+    still waiting at that moment
+    """
+
+    def __init__(self, body, deadline):
+        self.body = body
+        self.deadline = deadline
+        self._expired = False
+        self._handle = deadline.on_expiry(self._expire)
+
+    def __getattr__(self, name):
+        return getattr(self.body, name)
+
+    def read(self, amount=None):
+        self.deadline.check('reading the audio')
+        try:
+            data = self.body.read() if amount is None else self.body.read(amount)
+        except Exception:
+            if self._expired or self.deadline.expired():
+                raise self.deadline.exception('reading the audio')
+            raise
+        if self._expired:
+            # Closed under a read in progress, which may have returned a truncated chunk
+            raise self.deadline.exception('reading the audio')
+        if not data or amount is None or amount < 0:
+            self.deadline.discard(self._handle)
+        return data
+
+    def readinto(self, buffer):
+        readinto = getattr(self.body, 'readinto', None)
+        if readinto is None:
+            view = memoryview(buffer).cast('B')
+            data = self.read(len(view))
+            view[:len(data)] = data
+            return len(data)
+        self.deadline.check('reading the audio')
+        try:
+            read = readinto(buffer)
+        except Exception:
+            if self._expired or self.deadline.expired():
+                raise self.deadline.exception('reading the audio')
+            raise
+        if self._expired:
+            raise self.deadline.exception('reading the audio')
+        if not read:
+            self.deadline.discard(self._handle)
+        return read
+
+    def close(self):
+        self.deadline.discard(self._handle)
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
+
+    def _expire(self):
+        self._expired = True
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
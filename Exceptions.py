@@ -53,6 +53,37 @@ class RegionException(Exception):
 
 
 class BotoException(Exception):
-    def __init__(self, status, message):
+    # Error codes of requests that may succeed when sent again
+    THROTTLING_CODES = frozenset(['ThrottlingException', 'Throttling', 'TooManyRequestsException',
+                                  'RequestLimitExceeded', 'ProvisionedThroughputExceededException'])
+    RETRYABLE_CODES = THROTTLING_CODES | frozenset(['ServiceFailureException', 'ServiceUnavailableException',
+                                                    'InternalFailure', 'InternalServerError', 'RequestTimeout',
+                                                    'RequestTimeoutException', 'ConnectionError'])
+
+    def __init__(self, status, message, retryable=None, http_status=None):
+        self.code = status
+        self.http_status = http_status
+        self.throttled = status in self.THROTTLING_CODES
+        if retryable is None:
+            retryable = status in self.RETRYABLE_CODES or (http_status is not None and http_status >= 500)
+        self.retryable = retryable
         self.message = "{} {}".format(status, message)
         super(BotoException, self).__init__(self.message)
+
+
+class BufferException(Exception):
+    def __init__(self, message):
+        self.message = "{}".format(message)
+        super(BufferException, self).__init__(self.message)
+
+
+class QueueFullException(Exception):
+    def __init__(self, message):
+        self.message = "{}".format(message)
+        super(QueueFullException, self).__init__(self.message)
+
+
+class TimeoutException(TimeoutError):
+    def __init__(self, message):
+        self.message = "{}".format(message)
+        super(TimeoutException, self).__init__(self.message)
@@ -0,0 +1,200 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Per phase instrumentation of synthesis requests
+
+An observer registered on PollyTTS receives a SynthesisMetrics record for every request once it completes. When no
+observer is registered no timings are taken.
+
+"""
+
+import time
+
+
+class SynthesisMetrics:
+    """
+    Timings and sizes of one request. Durations are in seconds, phases a request did not go through are None.
+
+    operation - speak, stream, speak_long or speak_many
+    input_chars - length of the text passed by the caller
+    validation_seconds - resolving defaults and validating language, voice, engine and output format
+    ssml_seconds - converting the text to SSML
+    queue_seconds - waiting before the request could be sent, for the scheduler, the rate limiter or between retries
+    time_to_first_byte - from sending the request to the response headers, or to the first audio chunk for streams
+    read_seconds - reading the response body. For speak_long, synthesizing and reading all the parts
+    write_seconds - writing the audio to a file
+    total_seconds - the whole call
+    audio_bytes - size of the returned audio
+    cache - memory, disk, miss or coalesced. None when no cache or coalescing applied
+    error - class name of the exception raised, None on success
+    priority, tenant - scheduling class and tenant of the request. None without a scheduler
+    """
+
+    __slots__ = ('operation', 'lang', 'voice', 'engine', 'output_format', 'input_chars', 'validation_seconds',
+                 'ssml_seconds', 'queue_seconds', 'time_to_first_byte', 'read_seconds', 'write_seconds',
+                 'total_seconds', 'audio_bytes', 'cache', 'error', 'priority', 'tenant', 'started')
+
+    def __init__(self, operation, input_chars):
+        self.operation = operation
+        self.input_chars = input_chars
+        self.lang = None
+        self.voice = None
+        self.engine = None
+        self.output_format = None
+        self.validation_seconds = None
+        self.ssml_seconds = None
+        self.queue_seconds = None
+        self.time_to_first_byte = None
+        self.read_seconds = None
+        self.write_seconds = None
+        self.total_seconds = None
+        self.audio_bytes = None
+        self.cache = None
+        self.error = None
+        self.priority = None
+        self.tenant = None
+        self.started = time.perf_counter()
+
+    def __repr__(self):
+        return 'SynthesisMetrics({})'.format(', '.join('{}={!r}'.format(name, getattr(self, name))
+                                                       for name in self.__slots__ if name != 'started'))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'started'}
+
+    def add_queue_time(self, seconds):
+        self.queue_seconds = (self.queue_seconds or 0.0) + seconds
+
+
+class SynthesisObserver:
+    """
+    Base class of observers. Any callable taking a SynthesisMetrics can be registered as well.
+    """
+
+    def __call__(self, metrics):
+        self.on_request(metrics)
+
+    def on_request(self, metrics):
+        """
+        Called once per request when it completes or fails
+        @param metrics: SynthesisMetrics of the request
+        @return: None
+        """
+        return None
+
+
+class ObservedStream:
+    """
+    Audio stream reporting its metrics when exhausted or closed
+    """
+
+    def __init__(self, stream, metrics, report, sent=None):
+        """
+        Initiate class
+        @param stream: AudioStream or SharedStreamReader
+        @param metrics: SynthesisMetrics of the request
+        @param report: Callable receiving the metrics once the stream is closed
+        @param sent: time.perf_counter() value at which the request was sent. Default - now
+        """
+        self.stream = stream
+        self.metrics = metrics
+        self._report = report
+        self._sent = time.perf_counter() if sent is None else sent
+        self._first = None
+        self._reported = False
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.stream)
+        except StopIteration:
+            self.close()
+            raise
+        except BaseException as e:
+            self.metrics.error = type(e).__name__
+            self.close()
+            raise
+        if self._first is None:
+            self._first = time.perf_counter()
+            # Measured up to the first chunk rather than the response headers, without the time spent queueing
+            self.metrics.time_to_first_byte = self._first - self._sent - (self.metrics.queue_seconds or 0.0)
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.stream.close()
+        if self._reported:
+            return None
+        self._reported = True
+        now = time.perf_counter()
+        if self._first is not None:
+            self.metrics.read_seconds = now - self._first
+        self.metrics.audio_bytes = self.stream.bytes_read
+        self.metrics.total_seconds = now - self.metrics.started
+        self._report(self.metrics)
+        return None
+
+    def write_to(self, file):
+        written = 0
+        for chunk in self:
+            file.write(chunk)
+            written += len(chunk)
+        return written
+
+
+def timed_copy(stream, file, metrics):
+    """
+    Copy an audio stream to a file, accumulating the time spent reading and writing in the metrics
+    @param stream: Iterator of audio chunks
+    @param file: Binary file object to write to
+    @param metrics: SynthesisMetrics of the request
+    @return: Number of bytes written
+    """
+    clock = time.perf_counter
+    reading = writing = 0.0
+    written = 0
+    while True:
+        started = clock()
+        chunk = next(stream, None)
+        read = clock()
+        reading += read - started
+        if chunk is None:
+            break
+        file.write(chunk)
+        writing += clock() - read
+        written += len(chunk)
+    metrics.read_seconds = (metrics.read_seconds or 0.0) + reading
+    metrics.write_seconds = (metrics.write_seconds or 0.0) + writing
+    return written
@@ -0,0 +1,178 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Packing of many short utterances into one Polly request
+
+Short prompts are joined into one SSML document with a <mark> before each of them. The document is synthesized
+once, its ssml speech marks give the time at which every utterance starts, and the audio is cut at those times.
+pcm audio is cut at the sample, mp3 audio at the frame boundary closest to the mark.
+
+"""
+
+import bisect
+import re
+
+from Splitter import MAX_REQUEST_CHARS, _SPEAK
+
+# Output formats whose audio can be cut at arbitrary points
+PACKABLE_FORMATS = ('mp3', 'pcm')
+
+MARK_PREFIX = 'pollytts-'
+
+_SPEAK_OVERHEAD = len('<speak></speak>')
+
+# Utterances are wrapped in a sentence element so they keep their own intonation, unless they contain paragraphs
+# or sentences themselves, which cannot be nested in one
+_BLOCK = re.compile(r'<(?:p|s)[\s/>]')
+
+# Layer III bitrates in kbps by bitrate index, for MPEG 1 and for MPEG 2 and 2.5
+_MP3_BITRATES = {
+    True: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    False: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+# Sample rates by version bits (3 - MPEG 1, 2 - MPEG 2, 0 - MPEG 2.5) and sample rate index
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000)
+}
+
+
+def pack_ssml(documents, max_chars=MAX_REQUEST_CHARS):
+    """
+    Join SSML documents into as few documents of at most max_chars characters as possible, each utterance preceded
+    by a mark named after its position
+    @param documents: List of SSML documents, with or without the enclosing speak element
+    @param max_chars: Maximum length of each returned document
+    @return: List of tuples of a packed SSML document and the positions of the utterances it holds
+    """
+    packs = []
+    parts = []
+    positions = []
+    length = _SPEAK_OVERHEAD
+    for position, ssml in enumerate(documents):
+        match = _SPEAK.match(ssml)
+        body = (match.group(1) if match else ssml).strip()
+        if not _BLOCK.search(body):
+            body = '<s>' + body + '</s>'
+        part = '<mark name="{}{}"/>{}'.format(MARK_PREFIX, position, body)
+
+        if parts and length + len(part) > max_chars:
+            packs.append(('<speak>' + ''.join(parts) + '</speak>', positions))
+            parts = []
+            positions = []
+            length = _SPEAK_OVERHEAD
+        parts.append(part)
+        positions.append(position)
+        length += len(part)
+
+    if parts:
+        packs.append(('<speak>' + ''.join(parts) + '</speak>', positions))
+    return packs
+
+
+def mark_times(marks, positions):
+    """
+    Start times of packed utterances
+    @param marks: SpeechMarks of the packed document, including ssml marks
+    @param positions: Positions of the utterances in the document
+    @return: List of times in milliseconds, None when a mark is missing
+    """
+    times = {}
+    ssml = marks.of_type('ssml')
+    for time, name in zip(ssml.time, ssml.value):
+        times.setdefault(name, time)
+    try:
+        return [times[MARK_PREFIX + str(position)] for position in positions]
+    except KeyError:
+        return None
+
+
+def slice_audio(audio, times, output_format, sample_rate=None):
+    """
+    Cut the audio of a packed document into the audio of its utterances
+    @param audio: Audio bytes
+    @param times: Start time in milliseconds of every utterance
+    @param output_format: pcm or mp3
+    @param sample_rate: Sample rate of pcm audio in Hz
+    @return: List of audio bytes, one per utterance
+    """
+    if output_format == 'pcm':
+        offsets = [min(len(audio), int(round(time * int(sample_rate) / 1000.0)) * 2) for time in times]
+    else:
+        frames, starts = mp3_frames(audio)
+        offsets = [frames[_nearest(starts, time)] for time in times]
+
+    # The first utterance keeps anything before its mark, e.g. a tag or leading silence
+    offsets[0] = 0
+    offsets.append(len(audio))
+    for index in range(1, len(offsets)):
+        offsets[index] = max(offsets[index], offsets[index - 1])
+    return [audio[offsets[index]:offsets[index + 1]] for index in range(len(times))]
+
+
+def mp3_frames(audio):
+    """
+    Scan the frames of MPEG Layer III audio
+    @param audio: mp3 bytes
+    @return: Tuple of the byte offsets and the start times in milliseconds of the frames. The offset of the first
+    frame is 0 so leading tags stay with it. Scanning stops at the first byte that is not a frame header.
+    """
+    view = memoryview(audio)
+    position = 0
+    if view[:3] == b'ID3' and len(view) >= 10:
+        # Tag size is stored as four 7 bit bytes
+        position = 10 + ((view[6] << 21) | (view[7] << 14) | (view[8] << 7) | view[9])
+
+    offsets = [0]
+    starts = [0.0]
+    elapsed = 0.0
+    while position + 4 <= len(view):
+        if view[position] != 0xFF or view[position + 1] & 0xE0 != 0xE0:
+            break
+        version = (view[position + 1] >> 3) & 3
+        layer = (view[position + 1] >> 1) & 3
+        bitrate_index = view[position + 2] >> 4
+        rate_index = (view[position + 2] >> 2) & 3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            break
+        mpeg1 = version == 3
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        bitrate = _MP3_BITRATES[mpeg1][bitrate_index] * 1000
+        padding = (view[position + 2] >> 1) & 1
+        position += (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+        elapsed += (1152.0 if mpeg1 else 576.0) * 1000 / sample_rate
+        if position < len(view):
+            offsets.append(position)
+            starts.append(elapsed)
+    return offsets, starts
+
+
+def _nearest(values, value):
+    index = bisect.bisect_left(values, value)
+    if index > 0 and (index == len(values) or value - values[index - 1] <= values[index] - value):
+        index -= 1
+    return index
@@ -0,0 +1,307 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+PCM audio as NumPy arrays
+
+Polly returns pcm output as signed 16 bit little-endian mono samples at 8 or 16 kHz. The helpers below decode it
+without copying and post-process whole clips, or whole batches of clips, with vectorized operations.
+
+NumPy is optional. It is only needed by the array helpers and only imported when they are first used, an ImportError
+is raised when they are used without it.
+
+"""
+
+import struct
+from functools import lru_cache
+from math import gcd
+
+# numpy, imported by _require_numpy
+np = None
+
+# Sample rate of pcm output when none is requested
+DEFAULT_PCM_SAMPLE_RATE = 16000
+
+# Largest magnitude of a 16 bit sample
+FULL_SCALE = 32767
+
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("NumPy is required for PCM arrays, install it with pip install numpy")
+        np = numpy
+
+
+class PcmAudio:
+    """
+    Mono PCM clip with its sample rate
+    """
+
+    __slots__ = ('samples', 'sample_rate')
+
+    def __init__(self, samples, sample_rate=DEFAULT_PCM_SAMPLE_RATE):
+        """
+        Initiate class
+        @param samples: NumPy array of samples, int16 or float
+        @param sample_rate: Sample rate in Hz. Default - 16000
+        """
+        self.samples = samples
+        self.sample_rate = int(sample_rate)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __repr__(self):
+        return 'PcmAudio(samples={}, sample_rate={}, dtype={})'.format(len(self.samples), self.sample_rate,
+                                                                       self.samples.dtype)
+
+    @property
+    def duration(self):
+        """
+        Length of the clip in seconds
+        """
+        return len(self.samples) / float(self.sample_rate)
+
+    def normalize(self, peak=0.9):
+        return PcmAudio(normalize(self.samples, peak), self.sample_rate)
+
+    def trim_silence(self, threshold=0.01, padding=0.0):
+        return PcmAudio(trim_silence(self.samples, threshold, int(padding * self.sample_rate)), self.sample_rate)
+
+    def resample(self, sample_rate, quality=16):
+        return PcmAudio(resample(self.samples, self.sample_rate, sample_rate, quality), sample_rate)
+
+    def to_wav(self):
+        return to_wav(self.samples, self.sample_rate)
+
+
+def pcm_to_array(data):
+    """
+    View Polly pcm output as an array of samples without copying it
+    @param data: Bytes-like pcm audio
+    @return: int16 NumPy array sharing the memory of data. Read-only when data is
+    """
+    _require_numpy()
+    view = memoryview(data).cast('B')
+    # A truncated trailing byte cannot form a sample
+    return np.frombuffer(view[:len(view) - len(view) % 2], dtype='<i2')
+
+
+def normalize(samples, peak=0.9):
+    """
+    Scale a clip so its loudest sample reaches a fraction of full scale
+    @param samples: Array of samples, int16 or float in [-1, 1]
+    @param peak: Target peak as a fraction of full scale. Default - 0.9
+    @return: New array of the same dtype
+    """
+    _require_numpy()
+    return normalize_batch([samples], peak)[0]
+
+
+def normalize_batch(clips, peak=0.9):
+    """
+    Normalize many clips at once, each to its own peak
+    @param clips: List of sample arrays sharing one dtype
+    @param peak: Target peak as a fraction of full scale. Default - 0.9
+    @return: List of new arrays, in the order of clips
+    """
+    _require_numpy()
+    if not clips:
+        return []
+    dtype = clips[0].dtype
+    lengths = np.array([len(clip) for clip in clips])
+    samples = np.concatenate(clips).astype(np.float32)
+    full_scale = FULL_SCALE if dtype.kind == 'i' else 1.0
+
+    peaks = np.zeros(len(clips), dtype=np.float32)
+    present = lengths > 0
+    if present.any():
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[present]
+        peaks[present] = np.maximum.reduceat(np.abs(samples), starts)
+    gains = np.where(peaks > 0, peak * full_scale / np.maximum(peaks, 1e-12), 1.0).astype(np.float32)
+    samples *= np.repeat(gains, lengths)
+    return np.split(_to_dtype(samples, dtype), np.cumsum(lengths)[:-1])
+
+
+def trim_silence(samples, threshold=0.01, padding=0):
+    """
+    Remove leading and trailing samples quieter than a threshold
+    @param samples: Array of samples, int16 or float in [-1, 1]
+    @param threshold: Silence level as a fraction of full scale. Default - 0.01
+    @param padding: Samples of silence kept on each side. Default - 0
+    @return: View of the audible part of the clip, empty when the clip is silent
+    """
+    _require_numpy()
+    return trim_silence_batch([samples], threshold, padding)[0]
+
+
+def trim_silence_batch(clips, threshold=0.01, padding=0):
+    """
+    Trim the silence of many clips at once
+    @param clips: List of sample arrays sharing one dtype
+    @param threshold: Silence level as a fraction of full scale. Default - 0.01
+    @param padding: Samples of silence kept on each side. Default - 0
+    @return: List of views of the audible parts, in the order of clips
+    """
+    _require_numpy()
+    if not clips:
+        return []
+    level = threshold * (FULL_SCALE if clips[0].dtype.kind == 'i' else 1.0)
+    ends = np.cumsum([len(clip) for clip in clips])
+    samples = np.concatenate(clips)
+    loud = np.flatnonzero((samples > level) | (samples < -level))
+    owners = np.searchsorted(ends, loud, side='right')
+
+    # First and last loud sample of every clip containing one
+    owner_ids, firsts = np.unique(owners, return_index=True)
+    lasts = len(owners) - 1 - np.unique(owners[::-1], return_index=True)[1]
+    trimmed = [clip[:0] for clip in clips]
+    for owner, first, last in zip(owner_ids.tolist(), loud[firsts].tolist(), loud[lasts].tolist()):
+        start = ends[owner] - len(clips[owner])
+        first, last = first - start, last - start
+        trimmed[owner] = clips[owner][max(0, first - padding):last + 1 + padding]
+    return trimmed
+
+
+def resample(samples, from_rate, to_rate, quality=16):
+    """
+    Change the sample rate of a clip with a windowed sinc polyphase filter, e.g. from Polly's 8 or 16 kHz to 48 kHz
+    @param samples: Array of samples, int16 or float
+    @param from_rate: Sample rate of samples in Hz
+    @param to_rate: Target sample rate in Hz
+    @param quality: Filter taps per phase on each side, higher is sharper and slower. Default - 16
+    @return: New array of the same dtype
+    """
+    _require_numpy()
+    return resample_batch([samples], from_rate, to_rate, quality)[0]
+
+
+def resample_batch(clips, from_rate, to_rate, quality=16):
+    """
+    Resample many clips of the same rate in a single filtering pass
+    @param clips: List of sample arrays sharing one dtype
+    @param from_rate: Sample rate of the clips in Hz
+    @param to_rate: Target sample rate in Hz
+    @param quality: Filter taps per phase on each side. Default - 16
+    @return: List of new arrays, in the order of clips
+    """
+    _require_numpy()
+    if not clips:
+        return []
+    if from_rate == to_rate:
+        return [clip.copy() for clip in clips]
+    divisor = gcd(int(from_rate), int(to_rate))
+    up, down = int(to_rate) // divisor, int(from_rate) // divisor
+    taps = _lowpass(up, down, quality)
+
+    # Clips are laid out with enough silence between them for the filter not to mix them, each starting at a
+    # multiple of down so decimation keeps the same phase for every clip
+    gap = len(taps) // up + 1
+    starts = []
+    position = 0
+    for clip in clips:
+        position = -(-position // down) * down
+        starts.append(position)
+        position += len(clip) + gap
+    samples = np.zeros(position, dtype=np.float32)
+    for start, clip in zip(starts, clips):
+        samples[start:start + len(clip)] = clip
+
+    filtered = _upsample_filter(samples, taps, up)
+    dtype = clips[0].dtype
+    return [_to_dtype(filtered[start * up:(start + len(clip)) * up:down], dtype) for start, clip in zip(starts, clips)]
+
+
+@lru_cache(maxsize=16)
+def _lowpass(up, down, quality):
+    """
+    Kaiser windowed sinc low pass filter for resampling by up / down, with a DC gain of up
+    """
+    factor = max(up, down)
+    length = 2 * quality * factor + 1
+    cutoff = 0.5 / factor
+    offsets = np.arange(length) - (length - 1) / 2.0
+    taps = 2 * cutoff * np.sinc(2 * cutoff * offsets) * np.kaiser(length, 8.0)
+    taps *= up / taps.sum()
+    taps.setflags(write=False)
+    return taps
+
+
+def _upsample_filter(samples, taps, up):
+    """
+    Upsample by an integer factor and filter, one convolution per filter phase instead of filtering zeros
+    @return: Filtered samples at the upsampled rate, aligned with the input
+    """
+    length = -(-len(taps) // up) * up
+    padded = np.zeros(length, dtype=np.float32)
+    padded[:len(taps)] = taps
+    count = len(samples) + length // up - 1
+    output = np.empty((count, up), dtype=np.float32)
+    for phase in range(up):
+        output[:, phase] = np.convolve(samples, padded[phase::up])
+    delay = (len(taps) - 1) // 2
+    return output.ravel()[delay:delay + len(samples) * up]
+
+
+def _to_dtype(samples, dtype):
+    if dtype.kind == 'i':
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(samples), info.min, info.max).astype(dtype)
+    return samples.astype(dtype, copy=False)
+
+
+def wav_header(data_bytes, sample_rate, channels=1, sample_width=2):
+    """
+    RIFF/WAVE header for uncompressed PCM audio
+    @param data_bytes: Size of the audio data in bytes
+    @param sample_rate: Sample rate in Hz
+    @param channels: Number of channels. Default - 1
+    @param sample_width: Bytes per sample. Default - 2
+    @return: 44 byte header
+    """
+    block_align = channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE', b'fmt ', 16, 1, channels,
+                       int(sample_rate), int(sample_rate) * block_align, block_align, sample_width * 8, b'data',
+                       data_bytes)
+
+
+def to_wav(samples, sample_rate=DEFAULT_PCM_SAMPLE_RATE):
+    """
+    Wrap PCM audio in a WAV container
+    @param samples: Array of samples or bytes-like pcm audio
+    @param sample_rate: Sample rate in Hz. Default - 16000
+    @return: WAV file content as bytes
+    """
+    if hasattr(samples, 'dtype'):
+        _require_numpy()
+        if samples.dtype.kind != 'i':
+            samples = _to_dtype(samples * FULL_SCALE, np.dtype('<i2'))
+        data = memoryview(np.ascontiguousarray(samples, dtype='<i2')).cast('B')
+    else:
+        data = memoryview(samples).cast('B')
+    return b''.join((wav_header(len(data), sample_rate), data))
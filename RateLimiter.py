@@ -0,0 +1,164 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Client side rate limiting of Polly requests
+
+Polly limits SynthesizeSpeech transactions per second per account and region, with a lower limit for the neural
+engine. https://docs.aws.amazon.com/polly/latest/dg/limits.html
+
+Requests take a token from a bucket per account, region and engine before being sent. The refill rate of a bucket
+grows slowly while requests succeed and is halved when Polly throttles (additive increase, multiplicative decrease),
+so clients settle just under the account quota instead of producing bursts of throttling errors.
+
+"""
+
+import random
+import threading
+import time
+
+# Default SynthesizeSpeech quotas per engine: (transactions per second, burst)
+DEFAULT_RATES = {
+    'standard': (80.0, 100),
+    'neural': (8.0, 10)
+}
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket with an AIMD adjusted refill rate
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.5, increase=1.0, decrease=0.5):
+        """
+        Initiate class
+        @param rate: Starting and maximum refill rate in requests per second
+        @param burst: Maximum number of tokens. Default - one second of requests
+        @param min_rate: Lowest refill rate after repeated throttling. Default - 0.5
+        @param increase: Requests per second added to the rate for every rate worth of successes. Default - 1
+        @param decrease: Factor applied to the rate when throttled. Default - 0.5
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.throttled = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Take a token, waiting for one to be available
+        @param timeout: Maximum number of seconds to wait. Default - None (wait as long as needed)
+        @return: True if a token was taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def on_success(self):
+        """
+        Additively increase the rate, up to the configured rate
+        @return: None
+        """
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+        return None
+
+    def on_throttle(self):
+        """
+        Multiplicatively decrease the rate and drop accumulated tokens
+        @return: None
+        """
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+        return None
+
+
+class RateLimiter:
+    """
+    Token buckets per account, region and engine, shared by every client using the limiter
+    """
+
+    def __init__(self, rates=None):
+        """
+        Initiate class
+        @param rates: Dictionary mapping an engine, or a (region, engine) tuple, to a rate in requests per second or
+        to a (rate, burst) tuple. Missing entries use the Polly default quotas.
+        """
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, account, region, engine):
+        """
+        Token bucket for requests of an account to a region and engine
+        @param account: Identifier of the AWS account, usually the access key id
+        @param region: AWS region
+        @param engine: Speech engine
+        @return: TokenBucket
+        """
+        key = (account, region, engine)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    rate = self.rates.get((region, engine), self.rates.get(engine, DEFAULT_RATES['standard']))
+                    rate, burst = rate if isinstance(rate, tuple) else (rate, None)
+                    bucket = self._buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+
+def backoff_delay(attempt, base_delay=0.1, max_delay=5.0):
+    """
+    Exponential backoff with full jitter
+    @param attempt: Number of the retry, starting at 0
+    @param base_delay: Delay before the first retry in seconds
+    @param max_delay: Upper bound of the delay in seconds
+    @return: Seconds to wait before the retry
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+# Limiter shared by all PollyTTS instances unless another one is given
+default_limiter = RateLimiter()
@@ -0,0 +1,214 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Routing of requests between Polly regions
+
+A RegionPool holds a client per region and keeps an exponentially weighted moving average of the latency and
+error rate of every region. Requests go to the fastest healthy region offering their engine and voice. Regions
+that throttle or fail are avoided for a cooldown period, so requests fail over to the next best region.
+
+"""
+
+import threading
+import time
+
+# Regions offering the neural engine. The standard engine is offered in every region.
+# https://docs.aws.amazon.com/polly/latest/dg/NTTS-main.html
+ENGINE_REGIONS = {
+    'neural': frozenset(['ap-northeast-1', 'ap-northeast-2', 'ap-south-1', 'ap-southeast-1', 'ap-southeast-2',
+                         'ca-central-1', 'eu-central-1', 'eu-west-1', 'eu-west-2', 'us-east-1', 'us-west-2'])
+}
+
+# Error codes showing a region does not offer the requested voice or engine
+UNAVAILABLE_CODES = frozenset(['EngineNotSupportedException', 'LanguageNotSupportedException'])
+
+
+class RegionStats:
+    """
+    Moving averages of the latency and error rate of one region
+    """
+
+    __slots__ = ('region', 'client', 'order', 'latency', 'error_rate', 'cooldown_until', 'last_used', 'requests',
+                 'errors')
+
+    def __init__(self, region, client, order):
+        self.region = region
+        self.client = client
+        self.order = order
+        self.latency = None
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def healthy(self, now, max_error_rate):
+        return now >= self.cooldown_until and self.error_rate <= max_error_rate
+
+    def as_dict(self):
+        return {
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'cooling_down': time.monotonic() < self.cooldown_until,
+            'requests': self.requests,
+            'errors': self.errors
+        }
+
+
+class RegionPool:
+    """
+    Thread safe latency and health based routing between regions
+    """
+
+    def __init__(self, clients, alpha=0.2, cooldown=5.0, max_error_rate=0.5, probe_interval=30.0,
+                 engine_regions=None, client_factory=None):
+        """
+        Initiate class
+        @param clients: Ordered dictionary mapping regions to Polly clients, or to None for clients made by
+        client_factory. The first region is preferred while latencies are unknown
+        @param alpha: Weight of the newest sample in the moving averages. Default - 0.2
+        @param cooldown: Seconds a region is avoided after throttling or a server error. Default - 5
+        @param max_error_rate: Error rate above which a region is unhealthy. Default - 0.5
+        @param probe_interval: Seconds after which an unused healthy region receives a request to refresh its
+        latency. Default - 30
+        @param engine_regions: Dictionary mapping engines to the regions offering them. Default - ENGINE_REGIONS
+        @param client_factory: Callable creating the client of a region on its first request. Default - None
+        """
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.probe_interval = probe_interval
+        self.engine_regions = ENGINE_REGIONS if engine_regions is None else engine_regions
+        self.stats = {region: RegionStats(region, client, order)
+                      for order, (region, client) in enumerate(clients.items())}
+        self.client_factory = client_factory
+        self._unavailable = set()
+        self._lock = threading.Lock()
+        self._client_lock = threading.Lock()
+
+    @property
+    def regions(self):
+        return list(self.stats)
+
+    def client(self, region):
+        """
+        Polly client of a region, created on first use
+        @param region: AWS region
+        @return: Polly client
+        """
+        stats = self.stats[region]
+        if stats.client is None:
+            # Not under the routing lock, creating a client takes a while
+            with self._client_lock:
+                if stats.client is None:
+                    stats.client = self.client_factory(region)
+        return stats.client
+
+    def offers(self, region, voice, engine):
+        """
+        Whether a region offers a voice and engine
+        @param region: AWS region
+        @param voice: Voice id
+        @param engine: Speech engine
+        @return: True unless the engine is not offered there or the region refused the voice and engine before
+        """
+        regions = self.engine_regions.get(engine)
+        if regions is not None and region not in regions:
+            return False
+        return (region, voice, engine) not in self._unavailable
+
+    def choose(self, voice, engine, exclude=()):
+        """
+        Region to send a request to
+        @param voice: Voice id of the request
+        @param engine: Speech engine of the request
+        @param exclude: Regions already tried for the request
+        @return: RegionStats of the chosen region, None when no region offers the voice and engine
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [stats for stats in self.stats.values()
+                          if stats.region not in exclude and self.offers(stats.region, voice, engine)]
+            if not candidates:
+                return None
+            healthy = [stats for stats in candidates if stats.healthy(now, self.max_error_rate)]
+            if not healthy:
+                # Every region is failing, use the one recovering first
+                chosen = min(candidates, key=lambda stats: (stats.cooldown_until, stats.error_rate, stats.order))
+            else:
+                stale = [stats for stats in healthy if stats.latency is None or
+                         now - stats.last_used > self.probe_interval]
+                if stale:
+                    chosen = min(stale, key=lambda stats: (stats.latency is not None, stats.last_used, stats.order))
+                else:
+                    chosen = min(healthy, key=lambda stats: (stats.latency, stats.order))
+            chosen.last_used = now
+            return chosen
+
+    def record_success(self, region, latency):
+        """
+        Record a successful request
+        @param region: AWS region the request was sent to
+        @param latency: Seconds until the response arrived
+        @return: None
+        """
+        with self._lock:
+            stats = self.stats[region]
+            stats.requests += 1
+            stats.latency = latency if stats.latency is None else \
+                stats.latency + self.alpha * (latency - stats.latency)
+            stats.error_rate -= self.alpha * stats.error_rate
+        return None
+
+    def record_error(self, region, error, voice=None, engine=None):
+        """
+        Record a failed request
+        @param region: AWS region the request was sent to
+        @param error: BotoException raised for the request
+        @param voice: Voice id of the request
+        @param engine: Speech engine of the request
+        @return: True if the request should be sent to another region
+        """
+        with self._lock:
+            stats = self.stats[region]
+            stats.requests += 1
+            if error.code in UNAVAILABLE_CODES:
+                self._unavailable.add((region, voice, engine))
+                return True
+            if not error.retryable:
+                # The request itself is at fault, another region would refuse it as well
+                return False
+            stats.errors += 1
+            stats.error_rate += self.alpha * (1.0 - stats.error_rate)
+            stats.cooldown_until = time.monotonic() + self.cooldown
+            return True
+
+    def snapshot(self):
+        """
+        Current statistics of every region
+        @return: Dictionary mapping regions to their latency, error rate, cooldown state and counters
+        """
+        with self._lock:
+            return {region: stats.as_dict() for region, stats in self.stats.items()}
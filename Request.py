@@ -0,0 +1,116 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Parameters of a single synthesis request
+
+Requests are immutable and carried through validation, SSML conversion and sending, so one PollyTTS instance
+(and its connection pool) can serve many threads without requests overwriting each other.
+
+"""
+
+from Cache import cache_key
+
+
+class SynthesisRequest:
+    """
+    Immutable synthesis request.
+
+    Two requests are equal when they produce the same audio, i.e. when their SSML, voice, engine, output format,
+    sample rate and speech mark types match.
+    """
+
+    __slots__ = ('text', 'lang', 'voice', 'engine', 'output_format', 'text_type', 'formatted_text', 'sample_rate',
+                 'speech_mark_types')
+
+    def __init__(self, text, lang, voice, engine, output_format, text_type='text', formatted_text=None,
+                 sample_rate=None, speech_mark_types=None):
+        """
+        Initiate class
+        @param text: Text to convert to speech
+        @param lang: Speech output language
+        @param voice: Speech output voice
+        @param engine: Speech Engine
+        @param output_format: Speech output file format
+        @param text_type: Type can be text or SSML
+        @param formatted_text: SSML sent to Polly
+        @param sample_rate: Audio sample rate in Hz, as a string. None uses the Polly default for the format
+        @param speech_mark_types: Tuple of speech mark types requested with the json output format
+        """
+        set_attribute = object.__setattr__
+        set_attribute(self, 'text', text)
+        set_attribute(self, 'lang', lang)
+        set_attribute(self, 'voice', voice)
+        set_attribute(self, 'engine', engine)
+        set_attribute(self, 'output_format', output_format)
+        set_attribute(self, 'text_type', text_type)
+        set_attribute(self, 'formatted_text', formatted_text)
+        set_attribute(self, 'sample_rate', sample_rate)
+        set_attribute(self, 'speech_mark_types', speech_mark_types)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SynthesisRequest is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("SynthesisRequest is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, SynthesisRequest):
+            return NotImplemented
+        return self._identity() == other._identity()
+
+    def __hash__(self):
+        return hash(self._identity())
+
+    def __repr__(self):
+        return 'SynthesisRequest(lang={!r}, voice={!r}, engine={!r}, output_format={!r}, text={!r})'.format(
+            self.lang, self.voice, self.engine, self.output_format, self.text)
+
+    def _identity(self):
+        return (self.formatted_text, self.voice, self.engine, self.output_format, self.sample_rate,
+                self.speech_mark_types)
+
+    def replace(self, **changes):
+        """
+        Copy of the request with some parameters changed
+        @param changes: Parameters to change
+        @return: New SynthesisRequest
+        """
+        parameters = {name: getattr(self, name) for name in self.__slots__}
+        parameters.update(changes)
+        return SynthesisRequest(**parameters)
+
+    def cache_key(self, region):
+        """
+        Content address of the audio of the request
+        @param region: AWS region the request is sent to
+        @return: Hex digest identifying the request
+        """
+        parts = [self.formatted_text, self.voice, self.engine, self.output_format, region]
+        # Only added when set, so keys of plain audio requests stay the same
+        if self.sample_rate is not None:
+            parts.append(self.sample_rate)
+        if self.speech_mark_types is not None:
+            parts.append(','.join(self.speech_mark_types))
+        return cache_key(*parts)
@@ -0,0 +1,280 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+
+"""
+
+Prioritized scheduling of Polly calls
+
+A Scheduler bounds the number of calls in flight and decides which waiting call goes next. Priority classes are
+served strictly in order, so interactive requests overtake queued bulk work. Within a class, tenants share the
+capacity by weighted fair queuing on the number of characters they synthesize: a tenant submitting thousands of
+requests delays the others by its share of the capacity, not by the length of its backlog.
+
+The queue of every class is bounded. A request arriving at a full queue waits for room, or is rejected with a
+QueueFullException when the scheduler is created with reject=True.
+
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from Exceptions import QueueFullException, TimeoutException
+
+# Priority classes, lower is served first
+PRIORITIES = {'interactive': 0, 'default': 1, 'bulk': 2}
+
+
+class _Waiter:
+    __slots__ = ('start', 'sequence', 'granted', 'ready')
+
+    def __init__(self, start, sequence, lock):
+        self.start = start
+        self.sequence = sequence
+        self.granted = False
+        self.ready = threading.Condition(lock)
+
+    def __lt__(self, other):
+        return (self.start, self.sequence) < (other.start, other.sequence)
+
+
+class _ClassStats:
+    __slots__ = ('running', 'queued', 'completed', 'rejected', 'wait_seconds', 'max_wait_seconds')
+
+    def __init__(self):
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Scheduler:
+    """
+    Thread safe priority and fair share scheduler, shared by every PollyTTS instance given the same scheduler
+    """
+
+    def __init__(self, max_concurrency=10, max_queue=1000, weights=None, limits=None, reject=False):
+        """
+        Initiate class
+        @param max_concurrency: Maximum number of Polly calls in flight. Default - 10
+        @param max_queue: Maximum number of waiting requests per priority class. Default - 1000
+        @param weights: Dictionary mapping tenants to their share of the capacity. Missing tenants have weight 1
+        @param limits: Dictionary mapping priority classes to their maximum number of calls in flight, e.g.
+        {'bulk': 8} to always keep capacity for interactive requests. Default - None (no limit below max_concurrency)
+        @param reject: Raise QueueFullException instead of waiting when a queue is full. Default - False
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.weights = dict(weights or {})
+        self.limits = {self.level(priority): limit for priority, limit in (limits or {}).items()}
+        self.reject = reject
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+        self._queues = {}
+        self._virtual_time = {}
+        self._finish_tags = {}
+        self._stats = {}
+        self._running = 0
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def level(priority):
+        """
+        Rank of a priority class
+        @param priority: interactive, default, bulk or an integer, lower is served first
+        @return: Integer rank
+        """
+        if isinstance(priority, int):
+            return priority
+        try:
+            return PRIORITIES[priority]
+        except KeyError:
+            raise ValueError("Unknown priority {}, use one of {} or an integer".format(priority,
+                                                                                     ', '.join(PRIORITIES)))
+
+    def acquire(self, priority='default', tenant=None, cost=1, timeout=None):
+        """
+        Wait for the turn of a call
+        @param priority: Priority class of the call. Default - default
+        @param tenant: Tenant the call is accounted to. Default - None
+        @param cost: Work of the call, e.g. the number of characters synthesized. Default - 1
+        @param timeout: Maximum number of seconds to wait, TimeoutException is raised after. Default - None
+        @return: Seconds spent waiting
+        """
+        level = self.level(priority)
+        started = time.monotonic()
+        expires = None if timeout is None else started + timeout
+        with self._lock:
+            stats = self._stats.get(level)
+            if stats is None:
+                stats = self._stats[level] = _ClassStats()
+            queue = self._queues.setdefault(level, [])
+
+            if not queue and self._can_run(level) and not self._waiting_before(level):
+                self._run(stats)
+                return 0.0
+
+            while len(queue) >= self.max_queue:
+                if self.reject:
+                    stats.rejected += 1
+                    raise QueueFullException("Queue of priority {} is full with {} requests".format(priority,
+                                                                                                   len(queue)))
+                if not self._room.wait(None if expires is None else max(0.0, expires - time.monotonic())):
+                    raise TimeoutException("Deadline exceeded waiting for room in the queue of priority {}".format(
+                        priority))
+
+            # Start time fair queuing, tags only matter relative to the other tenants waiting in the class
+            if not queue:
+                self._virtual_time[level] = 0.0
+                self._finish_tags = {key: tag for key, tag in self._finish_tags.items() if key[0] != level}
+            start = max(self._virtual_time.get(level, 0.0), self._finish_tags.get((level, tenant), 0.0))
+            finish = start + float(cost) / self.weights.get(tenant, 1.0)
+            self._finish_tags[(level, tenant)] = finish
+            waiter = _Waiter(start, next(self._sequence), self._lock)
+            heapq.heappush(queue, waiter)
+            stats.queued += 1
+            self._dispatch()
+            while not waiter.granted:
+                if expires is None:
+                    waiter.ready.wait()
+                    continue
+                remaining = expires - time.monotonic()
+                if remaining <= 0 or not waiter.ready.wait(remaining) and not waiter.granted:
+                    queue.remove(waiter)
+                    heapq.heapify(queue)
+                    stats.queued -= 1
+                    self._room.notify_all()
+                    raise TimeoutException("Deadline exceeded waiting in the queue of priority {}".format(priority))
+
+            waited = time.monotonic() - started
+            stats.wait_seconds += waited
+            stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+            return waited
+
+    def release(self, priority='default'):
+        """
+        Mark a call as finished, letting the next waiting call start
+        @param priority: Priority class the call was acquired with
+        @return: None
+        """
+        level = self.level(priority)
+        with self._lock:
+            self._running -= 1
+            stats = self._stats[level]
+            stats.running -= 1
+            stats.completed += 1
+            self._dispatch()
+        return None
+
+    @contextmanager
+    def slot(self, priority='default', tenant=None, cost=1):
+        """
+        Context manager holding a turn for the duration of a block
+        @return: Seconds spent waiting
+        """
+        waited = self.acquire(priority, tenant, cost)
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    def snapshot(self):
+        """
+        Current state of every priority class
+        @return: Dictionary mapping priority ranks to calls running, queued, completed and rejected, and the total
+        and longest wait in seconds
+        """
+        with self._lock:
+            return {level: stats.as_dict() for level, stats in sorted(self._stats.items())}
+
+    def _can_run(self, level):
+        if self._running >= self.max_concurrency:
+            return False
+        limit = self.limits.get(level)
+        return limit is None or self._stats[level].running < limit
+
+    def _waiting_before(self, level):
+        return any(queue for other, queue in self._queues.items() if other <= level)
+
+    def _run(self, stats):
+        self._running += 1
+        stats.running += 1
+
+    def _dispatch(self):
+        # Called with the lock held
+        for level in sorted(self._queues):
+            queue = self._queues[level]
+            while queue and self._can_run(level):
+                waiter = heapq.heappop(queue)
+                stats = self._stats[level]
+                stats.queued -= 1
+                self._run(stats)
+                self._virtual_time[level] = waiter.start
+                waiter.granted = True
+                waiter.ready.notify()
+                self._room.notify_all()
+            if self._running >= self.max_concurrency:
+                break
+
+
+class ScheduledBody:
+    """
+    Response body giving back the turn of its call once it has been read to the end or closed
+    """
+
+    def __init__(self, body, release):
+        self.body = body
+        self._release = release
+
+    def __getattr__(self, name):
+        return getattr(self.body, name)
+
+    def read(self, amount=None):
+        data = self.body.read() if amount is None else self.body.read(amount)
+        if amount is None or amount < 0 or not data:
+            self._done()
+        return data
+
+    def close(self):
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._done()
+
+    def __del__(self):
+        self._done()
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
@@ -0,0 +1,168 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Polly speech marks
+
+With the json output format Polly returns speech marks, one JSON object per line:
+{"time":6,"type":"word","start":0,"end":4,"value":"Mary"}
+https://docs.aws.amazon.com/polly/latest/dg/speechmarks.html
+
+Marks are kept in columns of compact arrays rather than one dictionary per mark, and are only parsed when first
+accessed. The arrays support the buffer protocol, e.g. numpy.frombuffer(marks.time, dtype=numpy.int64).
+
+"""
+
+import json
+import re
+import sys
+from array import array
+
+# Speech mark types Polly can return
+SPEECH_MARK_TYPES = ('sentence', 'ssml', 'viseme', 'word')
+
+# Mark types requested when none are given
+DEFAULT_SPEECH_MARK_TYPES = ('sentence', 'word')
+
+# Lines as Polly writes them. Viseme marks have no start and end.
+_MARK_PATTERN = re.compile(r'\{"time":(\d+),"type":"(\w+)"(?:,"start":(\d+),"end":(\d+))?,'
+                           r'"value":"([^"\\]*(?:\\.[^"\\]*)*)"\}')
+
+_TYPE_CODES = {name: code for code, name in enumerate(SPEECH_MARK_TYPES)}
+
+
+class SpeechMarks:
+    """
+    Columnar, lazily parsed speech marks.
+
+    time - array of mark times in milliseconds from the start of the audio
+    type - array of indices into SPEECH_MARK_TYPES
+    start, end - arrays of byte offsets of the marked text in the request, -1 for visemes
+    value - list of the marked words, sentences, mark names or visemes
+    """
+
+    def __init__(self, data=b'', columns=None):
+        """
+        Initiate class
+        @param data: Bytes-like newline delimited JSON returned by Polly
+        @param columns: Already parsed (time, type, start, end, value) columns. Default - None
+        """
+        self._data = data
+        self._columns = columns
+
+    def __len__(self):
+        return len(self._parse()[0])
+
+    def __iter__(self):
+        time, types, start, end, value = self._parse()
+        for index in range(len(time)):
+            yield time[index], SPEECH_MARK_TYPES[types[index]], start[index], end[index], value[index]
+
+    def __getitem__(self, index):
+        time, types, start, end, value = self._parse()
+        return time[index], SPEECH_MARK_TYPES[types[index]], start[index], end[index], value[index]
+
+    def __repr__(self):
+        return 'SpeechMarks({} marks)'.format(len(self))
+
+    @property
+    def time(self):
+        return self._parse()[0]
+
+    @property
+    def type(self):
+        return self._parse()[1]
+
+    @property
+    def start(self):
+        return self._parse()[2]
+
+    @property
+    def end(self):
+        return self._parse()[3]
+
+    @property
+    def value(self):
+        return self._parse()[4]
+
+    def of_type(self, mark_type):
+        """
+        Marks of a single type
+        @param mark_type: sentence, ssml, viseme or word
+        @return: SpeechMarks
+        """
+        code = _TYPE_CODES[mark_type]
+        time, types, start, end, value = self._parse()
+        indices = [index for index, found in enumerate(types) if found == code]
+        return SpeechMarks(columns=(array('q', [time[index] for index in indices]),
+                                    array('b', [code]) * len(indices),
+                                    array('q', [start[index] for index in indices]),
+                                    array('q', [end[index] for index in indices]),
+                                    [value[index] for index in indices]))
+
+    def _parse(self):
+        if self._columns is None:
+            self._columns = parse_speech_marks(self._data)
+            self._data = None
+        return self._columns
+
+
+def parse_speech_marks(data):
+    """
+    Parse newline delimited speech marks into columns
+    @param data: Bytes-like or str speech marks as returned by Polly
+    @return: Tuple of time, type, start, end and value columns
+    """
+    text = data if isinstance(data, str) else str(data, 'utf-8')
+
+    lines = text.count('\n') + (0 if not text or text.endswith('\n') else 1)
+    matches = _MARK_PATTERN.findall(text)
+    if len(matches) == lines:
+        if not matches:
+            return array('q'), array('b'), array('q'), array('q'), []
+        times, types, starts, ends, values = zip(*matches)
+        if '' in starts:
+            # Visemes have no offsets
+            starts = [start or -1 for start in starts]
+            ends = [end or -1 for end in ends]
+        if '\\' in text:
+            values = [json.loads('"' + value + '"') if '\\' in value else value for value in values]
+        return (array('q', map(int, times)),
+                array('b', map(_TYPE_CODES.__getitem__, types)),
+                array('q', map(int, starts)),
+                array('q', map(int, ends)),
+                list(map(sys.intern, values)))
+
+    # Fields in another order or extra whitespace, decode every line
+    time, types, start, end, value = array('q'), array('b'), array('q'), array('q'), []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        mark = json.loads(line)
+        time.append(mark['time'])
+        types.append(_TYPE_CODES[mark['type']])
+        start.append(mark.get('start', -1))
+        end.append(mark.get('end', -1))
+        value.append(mark.get('value', ''))
+    return time, types, start, end, value
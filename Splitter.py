@@ -0,0 +1,175 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Split long SSML documents into pieces Polly accepts in a single request
+
+https://docs.aws.amazon.com/polly/latest/dg/limits.html
+
+Documents are only cut at sentence ends (falling back to word boundaries for very long sentences). Elements that
+are open at a cut are closed at the end of the piece and reopened at the start of the next one, elements whose
+content must be read as a whole (say-as, phoneme, sub, w) are never cut.
+
+"""
+
+import re
+
+from Exceptions import LanguageException
+
+# SynthesizeSpeech accepts at most 3000 billed characters. Counting every character, tags included, keeps each
+# piece under that limit.
+MAX_REQUEST_CHARS = 3000
+
+ATOMIC_ELEMENTS = frozenset(['say-as', 'phoneme', 'sub', 'w'])
+
+_SPEAK = re.compile(r'\A\s*<speak[^>]*>(.*)</speak>\s*\Z', re.S)
+_TOKEN = re.compile(r'(<[^>]+>)')
+_TAG = re.compile(r'<(/?)([\w:.-]+)[^>]*?(/?)>\Z', re.S)
+_SENTENCE = re.compile(r'\S.*?(?:[.!?]+(?:\s+|\Z)|\Z)', re.S)
+_WORD = re.compile(r'\S+\s*')
+_SPEAK_OVERHEAD = len('<speak></speak>')
+
+
+def split_ssml(ssml, max_chars=MAX_REQUEST_CHARS):
+    """
+    Split an SSML document into documents of at most max_chars characters
+    @param ssml: SSML document, with or without the enclosing speak element
+    @param max_chars: Maximum length of each returned document
+    @return: List of SSML documents, each enclosed in a speak element
+    """
+    match = _SPEAK.match(ssml)
+    inner = match.group(1) if match else ssml
+
+    if len(inner) + _SPEAK_OVERHEAD <= max_chars:
+        return ['<speak>' + inner + '</speak>']
+
+    chunks = []
+    stack = []
+    prefix = ''
+    parts = []
+    length = 0
+    pending = _atoms(inner, _SENTENCE)
+    pending.reverse()
+    while pending:
+        atom = pending.pop()
+        after = _apply_tags(stack, atom)
+        if parts and len(prefix) + length + len(atom) + _closing_length(after) + _SPEAK_OVERHEAD > max_chars:
+            chunks.append('<speak>' + prefix + ''.join(parts) + _closing(stack) + '</speak>')
+            prefix = ''.join(tag for _, tag in stack)
+            parts = []
+            length = 0
+        if len(prefix) + len(atom) + _closing_length(after) + _SPEAK_OVERHEAD > max_chars:
+            # Sentence too long for a single request, fall back to word boundaries
+            words = _atoms(atom, _WORD)
+            if len(words) < 2:
+                raise LanguageException("Text can not be split into requests of {} characters".format(max_chars))
+            pending.extend(reversed(words))
+            continue
+        parts.append(atom)
+        length += len(atom)
+        stack = after
+
+    if parts:
+        chunks.append('<speak>' + prefix + ''.join(parts) + _closing(stack) + '</speak>')
+    return chunks
+
+
+def _atoms(inner, pattern):
+    """
+    Cut SSML content into the smallest pieces that may start a new request
+    @param inner: SSML content without the speak element
+    @param pattern: Regular expression matching a sentence (or word) of plain text
+    @return: List of SSML fragments
+    """
+    atoms = []
+    current = []
+    atomic_depth = 0
+    boundary = False
+
+    for token in _TOKEN.split(inner):
+        if not token:
+            continue
+        tag = _TAG.match(token)
+        if tag:
+            closing, name, self_closing = tag.groups()
+            if not closing and not self_closing:
+                if boundary and atomic_depth == 0:
+                    atoms.append(''.join(current))
+                    current = []
+                    boundary = False
+                if name in ATOMIC_ELEMENTS:
+                    atomic_depth += 1
+            elif closing and name in ATOMIC_ELEMENTS:
+                atomic_depth -= 1
+            current.append(token)
+            continue
+
+        if atomic_depth:
+            current.append(token)
+            continue
+
+        lead = len(token) - len(token.lstrip())
+        if lead:
+            current.append(token[:lead])
+        for piece in pattern.finditer(token, lead):
+            if boundary:
+                atoms.append(''.join(current))
+                current = []
+            current.append(piece.group())
+            boundary = pattern is _WORD or piece.group().rstrip()[-1] in '.!?'
+
+    if current:
+        atoms.append(''.join(current))
+    return atoms
+
+
+def _apply_tags(stack, fragment):
+    """
+    Open element stack after a fragment
+    @param stack: List of (name, opening tag) open before the fragment
+    @param fragment: SSML fragment
+    @return: List of (name, opening tag) open after the fragment
+    """
+    stack = list(stack)
+    for token in _TOKEN.findall(fragment):
+        tag = _TAG.match(token)
+        if not tag:
+            continue
+        closing, name, self_closing = tag.groups()
+        if closing:
+            for position in range(len(stack) - 1, -1, -1):
+                if stack[position][0] == name:
+                    del stack[position:]
+                    break
+        elif not self_closing:
+            stack.append((name, token))
+    return stack
+
+
+def _closing(stack):
+    return ''.join('</{}>'.format(name) for name, _ in reversed(stack))
+
+
+def _closing_length(stack):
+    return sum(len(name) + 3 for name, _ in stack)
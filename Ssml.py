@@ -0,0 +1,94 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Conversion of the simplified speak tags to SSML
+
+https://docs.aws.amazon.com/polly/latest/dg/supportedtags.html
+
+All tags are translated in a single scan of the text with one regular expression compiled at import. Recent
+conversions of short texts are memoized.
+
+"""
+
+import functools
+import re
+
+TAG_REPLACEMENTS = {
+    '<whisper>': '<amazon:effect name="whispered">',
+    '</whisper>': '</amazon:effect>',
+    '<soft>': '<amazon:effect phonation="soft">',
+    '</soft>': '</amazon:effect>',
+    '<newscaster>': '<amazon:domain name="news">',
+    '</newscaster>': '</amazon:domain>',
+    '<convo>': '<amazon:domain name="conversational">',
+    '</convo>': '</amazon:domain>',
+    '<telephone>': '<say-as interpret-as="telephone">',
+    '</telephone>': '</say-as>',
+    '<fraction>': '<say-as interpret-as="fraction">',
+    '</fraction>': '</say-as>',
+    '<bleep>': '<say-as interpret-as="expletive">',
+    '</bleep>': '</say-as>',
+    '<address>': '<say-as interpret-as="address">',
+    '</address>': '</say-as>',
+    '<time>': '<say-as interpret-as="time">',
+    '</time>': '</say-as>',
+    '<unit>': '<say-as interpret-as="unit">',
+    '</unit>': '</say-as>',
+    '<digits>': '<say-as interpret-as="digits">',
+    '</digits>': '</say-as>',
+    '<ordinal>': '<say-as interpret-as="ordinal">',
+    '</ordinal>': '</say-as>',
+    '<number>': '<say-as interpret-as="number">',
+    '</number>': '</say-as>',
+    '<spell>': '<say-as interpret-as="spell-out">',
+    '</spell>': '</say-as>',
+    '<emphasize>': '<emphasis level="strong">',
+    '</emphasize>': '</emphasis>',
+    '<break>': '<break time="2s"/>'
+}
+
+# Texts up to this length are memoized
+MEMOIZE_MAX_CHARS = 4096
+
+_TAG_PATTERN = re.compile('|'.join(re.escape(tag) for tag in sorted(TAG_REPLACEMENTS, key=len, reverse=True)))
+_replace_tag = functools.partial(_TAG_PATTERN.sub, lambda match: TAG_REPLACEMENTS[match.group()])
+
+
+def text_to_ssml(text):
+    """
+    Convert plain text with speak tags to an SSML document
+    @param text: Input text to convert to SSML format
+    @return: SSML formatted text
+    """
+    if len(text) <= MEMOIZE_MAX_CHARS:
+        return _memoized_text_to_ssml(text)
+    return _text_to_ssml(text)
+
+
+def _text_to_ssml(text):
+    return '<speak>' + _replace_tag(text.strip()) + '</speak>'
+
+
+_memoized_text_to_ssml = functools.lru_cache(maxsize=1024)(_text_to_ssml)
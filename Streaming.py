@@ -0,0 +1,254 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Incremental delivery of synthesized audio
+
+Polly starts sending audio before the whole utterance is synthesized. Reading the response body in fixed size
+chunks lets callers start playback as soon as the first bytes arrive.
+
+"""
+
+import os
+import tempfile
+import time
+import uuid
+
+from Metrics import timed_copy
+from Exceptions import BufferException
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# Chunk size used when a whole response is read in pieces rather than played incrementally
+READ_CHUNK_SIZE = 256 * 1024
+
+# File extensions of the Polly output formats. json output holds speech marks, one JSON object per line
+FILE_EXTENSIONS = {
+    'mp3': '.mp3',
+    'ogg_vorbis': '.ogg',
+    'pcm': '.pcm',
+    'json': '.json'
+}
+
+
+class AudioStream:
+    """
+    Iterator yielding fixed size chunks of a Polly response body.
+
+    The underlying HTTP connection is released when the stream is exhausted, closed or used as a context manager
+    and left early.
+    """
+
+    def __init__(self, body, chunk_size=DEFAULT_CHUNK_SIZE, started=None, on_complete=None):
+        """
+        Initiate class
+        @param body: Object providing read(amount) and close(), usually a botocore StreamingBody
+        @param chunk_size: Size of the yielded chunks in bytes. Default - 16 KB
+        @param started: time.monotonic() value at which the request was sent. Default - now
+        @param on_complete: Callable receiving the complete audio once the stream is fully consumed. Default - None
+        """
+        self.body = body
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.started = time.monotonic() if started is None else started
+        self.time_to_first_byte = None
+        self.bytes_read = 0
+        self.closed = False
+        self._on_complete = on_complete
+        self._chunks = [] if on_complete is not None else None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+
+        chunk = self.body.read(self.chunk_size)
+        if not chunk:
+            if self._on_complete is not None:
+                self._on_complete(b''.join(self._chunks))
+            self.close()
+            raise StopIteration
+
+        if self.time_to_first_byte is None:
+            self.time_to_first_byte = time.monotonic() - self.started
+        self.bytes_read += len(chunk)
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """
+        Release the underlying connection. Safe to call more than once.
+        @return: None
+        """
+        if self.closed:
+            return None
+        self.closed = True
+        self._chunks = None
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
+        return None
+
+    def write_to(self, file):
+        """
+        Copy the remaining audio to a file object chunk by chunk
+        @param file: Binary file object to write to
+        @return: Number of bytes written
+        """
+        written = 0
+        for chunk in self:
+            file.write(chunk)
+            written += len(chunk)
+        return written
+
+
+def read_into(body, buffer=None, size_hint=None):
+    """
+    Read a response body directly into memory with readinto semantics, without building intermediate chunks.
+    @param body: Object providing read(amount), and preferably readinto(buffer), usually a botocore StreamingBody
+    @param buffer: Writable bytes-like object receiving the audio. Default - None (a buffer grown as needed)
+    @param size_hint: Expected size in bytes, used to size the grown buffer. Default - None
+    @return: memoryview of the bytes written
+    """
+    growable = buffer is None
+    if growable:
+        buffer = bytearray(size_hint or READ_CHUNK_SIZE)
+    view = memoryview(buffer).cast('B')
+    readinto = getattr(body, 'readinto', None)
+    filled = 0
+    try:
+        while True:
+            if filled == len(view):
+                # Usually the exact size is known, a one byte read finds the end without growing the buffer
+                probe = body.read(1)
+                if not probe:
+                    break
+                if not growable:
+                    raise BufferException("Audio does not fit in the {} byte buffer".format(len(view)))
+                # Doubled with the audio read rather than with zeros later overwritten
+                view.release()
+                buffer += probe
+                buffer += body.read(len(buffer))
+                filled = len(buffer)
+                view = memoryview(buffer)
+                continue
+            if readinto is not None:
+                read = readinto(view[filled:])
+            else:
+                chunk = body.read(min(READ_CHUNK_SIZE, len(view) - filled))
+                read = len(chunk)
+                view[filled:filled + read] = chunk
+            if not read:
+                break
+            filled += read
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+
+    if growable:
+        # Give back the unused tail, bytearray shrinks in place
+        view.release()
+        del buffer[filled:]
+        return memoryview(buffer)
+    return view[:filled]
+
+
+def is_file_object(destination):
+    """
+    Whether a save_to_file destination is an open file object rather than a directory
+    @param destination: save_to_file value
+    @return: True for objects providing write()
+    """
+    return hasattr(destination, 'write')
+
+
+def save_audio(chunks, destination, name, output_format, metrics=None):
+    """
+    Write audio chunk by chunk to an open file object, or to <directory>/<name><extension>.
+
+    Files are written under a temporary name in the target directory and renamed into place once complete, so a
+    partially written file is never visible under its final name. Only one chunk is held in memory at a time.
+    @param chunks: Iterable of audio bytes, e.g. an AudioStream
+    @param destination: Open binary file object or directory. True - the system temporary directory
+    @param name: File name without extension
+    @param output_format: Polly output format, determining the extension
+    @param metrics: SynthesisMetrics receiving the read and write times. Default - None
+    @return: The file object, or the path of the written file
+    """
+    if is_file_object(destination):
+        _copy(chunks, destination, metrics)
+        return destination
+
+    if destination is True:
+        directory = tempfile.gettempdir()
+    else:
+        directory = os.fspath(destination)
+        os.makedirs(directory, exist_ok=True)
+    extension = FILE_EXTENSIONS.get(output_format, '.' + output_format)
+    return write_file(os.path.join(directory, name + extension), lambda file: _copy(chunks, file, metrics))
+
+
+def write_file(path, write):
+    """
+    Write a file under a temporary name in its directory and rename it into place once complete.
+
+    The temporary file is created by open() rather than tempfile.mkstemp, so it gets the permissions of any other
+    new file (0666 less the umask) instead of being readable by its owner only.
+    @param path: Path of the file
+    @param write: Callable writing the content to the given binary file object
+    @return: path
+    """
+    temp_path = os.path.join(os.path.dirname(path), '.tmp-{}{}'.format(uuid.uuid4().hex, os.path.splitext(path)[1]))
+    try:
+        with open(temp_path, 'xb') as file:
+            write(file)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+def _copy(chunks, file, metrics):
+    if metrics is not None:
+        metrics.audio_bytes = timed_copy(iter(chunks), file, metrics)
+        return None
+    for chunk in chunks:
+        file.write(chunk)
+    return None
@@ -34,9 +34,11 @@ GET /v1/voices?Engine=Engine&IncludeAdditionalLanguageCodes=IncludeAdditionalLan
 
 """
 
+import functools
 import json
+import types
 
-from Exceptions import LanguageException
+from Exceptions import LanguageException, EngineException
 
 
 class LangArb:
@@ -605,48 +607,210 @@ class LangCyGb:
         }
 
 
+class VoiceRecord:
+    """
+    Immutable details of a voice. Indexing by 'gender', 'standard' or 'neural' is kept for code written against the
+    dictionaries of the Lang* classes.
+    """
+
+    __slots__ = ('name', 'gender', 'standard', 'neural', 'languages')
+
+    def __init__(self, name, gender, standard, neural, languages):
+        set_attribute = object.__setattr__
+        set_attribute(self, 'name', name)
+        set_attribute(self, 'gender', gender)
+        set_attribute(self, 'standard', standard)
+        set_attribute(self, 'neural', neural)
+        set_attribute(self, 'languages', languages)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VoiceRecord is immutable")
+
+    def __getitem__(self, key):
+        if key not in ('gender', 'standard', 'neural'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return 'VoiceRecord({!r})'.format(self.name)
+
+    def supports(self, engine):
+        return engine in ('standard', 'neural') and getattr(self, engine)
+
+
+class LanguageRecord:
+    """
+    Immutable details of a language, shared by all lookups
+    """
+
+    __slots__ = ('id', 'name', 'default', 'voices')
+
+    def __init__(self, id, name, default, voices):
+        set_attribute = object.__setattr__
+        set_attribute(self, 'id', id)
+        set_attribute(self, 'name', name)
+        set_attribute(self, 'default', default)
+        set_attribute(self, 'voices', voices)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LanguageRecord is immutable")
+
+    def __repr__(self):
+        return 'LanguageRecord({!r})'.format(self.id)
+
+
+SUPPORTED_LANG = ('arb', 'cmn-CN', 'da-DK', 'nl-NL', 'en-AU', 'en-GB', 'en-IN', 'en-US', 'en-GB-WLS', 'fr-FR', 'fr-CA',
+                  'de-DE', 'hi-IN', 'is-IS', 'it-IT', 'ja-JP', 'ko-KR', 'nb-NO', 'pl-PL', 'pt-BR', 'pt-PT', 'ro-RO',
+                  'ru-RU', 'es-ES', 'es-MX', 'es-US', 'sv-SE', 'tr-TR', 'cy-GB')
+
+SUPPORTED_LANG_CLASSES = {
+    'arb': LangArb,
+    'cmn-CN': LangCmnCn,
+    'da-DK': LangDaDk,
+    'nl-NL': LangNlNl,
+    'en-AU': LangEnAu,
+    'en-GB': LangEnGb,
+    'en-IN': LangEnIn,
+    'en-US': LangEnUs,
+    'en-GB-WLS': LangEnGbWls,
+    'fr-FR': LangFrFr,
+    'fr-CA': LangFrCa,
+    'de-DE': LangDeDe,
+    'hi-IN': LangHiIn,
+    'is-IS': LangIsIs,
+    'it-IT': LangItIt,
+    'ja-JP': LangJaJp,
+    'ko-KR': LangKoKr,
+    'nb-NO': LangNbNo,
+    'pl-PL': LangPlPl,
+    'pt-BR': LangPtBr,
+    'pt-PT': LangPtPt,
+    'ro-RO': LangRoRo,
+    'ru-RU': LangRuRu,
+    'es-ES': LangEsEs,
+    'es-MX': LangEsMx,
+    'es-US': LangEsUs,
+    'sv-SE': LangSvSE,
+    'tr-TR': LangTrTr,
+    'cy-GB': LangCyGb
+}
+
+
+def _build_index():
+    """
+    Build the lookup tables from the Lang* classes
+    @return: Tuple of languages by id, voices by name, voice names by engine, voice names by gender and language ids
+    """
+    details = [SUPPORTED_LANG_CLASSES[lang]() for lang in SUPPORTED_LANG]
+
+    voice_languages = {}
+    voice_details = {}
+    for language in details:
+        for name, voice in language.voices.items():
+            voice_languages.setdefault(name, []).append(language.id)
+            voice_details[name] = voice
+
+    voices = {
+        name: VoiceRecord(name, voice['gender'], voice['standard'], voice['neural'],
+                          frozenset(voice_languages[name]))
+        for name, voice in voice_details.items()
+    }
+    languages = {
+        language.id: LanguageRecord(language.id, language.name, language.default,
+                                    types.MappingProxyType({name: voices[name] for name in language.voices}))
+        for language in details
+    }
+    by_engine = {
+        engine: frozenset(name for name, voice in voices.items() if voice.supports(engine))
+        for engine in ('standard', 'neural')
+    }
+    by_gender = {}
+    for name, voice in voices.items():
+        by_gender.setdefault(voice.gender, set()).add(name)
+
+    return (types.MappingProxyType(languages), types.MappingProxyType(voices), types.MappingProxyType(by_engine),
+            types.MappingProxyType({gender: frozenset(names) for gender, names in by_gender.items()}),
+            frozenset(languages))
+
+
+# Lookup tables, built on first use rather than when the module is imported
+_INDEX_NAMES = ('LANGUAGES', 'VOICES', 'VOICES_BY_ENGINE', 'VOICES_BY_GENDER', 'LANGUAGE_IDS')
+
+
+@functools.lru_cache(maxsize=1)
+def _index():
+    return _build_index()
+
+
+def __getattr__(name):
+    if name in _INDEX_NAMES:
+        return _index()[_INDEX_NAMES.index(name)]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+@functools.lru_cache(maxsize=1024)
+def check_voice(lang, voice, engine):
+    """
+    Check a language, voice and engine combination. Results are cached per combination.
+    @param lang: Language code
+    @param voice: Voice name
+    @param engine: Speech engine
+    @return: None if the combination is valid, otherwise a tuple of exception class and message
+    """
+    if voice and not lang:
+        return LanguageException, "Voice defined witout defining language!"
+    language = _index()[0].get(lang)
+    if language is None:
+        return LanguageException, "Requested language {} not available!".format(lang)
+    record = language.voices.get(voice)
+    if record is None:
+        return LanguageException, "Requested language {} does not have voice {}!".format(lang, voice)
+    if engine in ('standard', 'neural') and not record.supports(engine):
+        return EngineException, "Requested voice {} does not support the {} engine".format(voice, engine)
+    return None
+
+
 class Voices:
-    def __init__(self):
-        # Language Details
-        self.supported_lang = ['arb', 'cmn-CN', 'da-DK', 'nl-NL', 'en-AU', 'en-GB', 'en-IN', 'en-US', 'en-GB-WLS',
-                               'fr-FR', 'fr-CA', 'de-DE', 'hi-IN', 'is-IS', 'it-IT', 'ja-JP', 'ko-KR', 'nb-NO', 'pl-PL',
-                               'pt-BR', 'pt-PT', 'ro-RO', 'ru-RU', 'es-ES', 'es-MX', 'es-US', 'sv-SE', 'tr-TR', 'cy-GB']
-        self.supported_lang_classes = {
-            'arb': LangArb,
-            'cmn-CN': LangCmnCn,
-            'da-DK': LangDaDk,
-            'nl-NL': LangNlNl,
-            'en-AU': LangEnAu,
-            'en-GB': LangEnGb,
-            'en-IN': LangEnIn,
-            'en-US': LangEnUs,
-            'en-GB-WLS': LangEnGbWls,
-            'fr-FR': LangFrFr,
-            'fr-CA': LangFrCa,
-            'de-DE': LangDeDe,
-            'hi-IN': LangHiIn,
-            'is-IS': LangIsIs,
-            'it-IT': LangItIt,
-            'ja-JP': LangJaJp,
-            'ko-KR': LangKoKr,
-            'nb-NO': LangNbNo,
-            'pl-PL': LangPlPl,
-            'pt-BR': LangPtBr,
-            'pt-PT': LangPtPt,
-            'ro-RO': LangRoRo,
-            'ru-RU': LangRuRu,
-            'es-ES': LangEsEs,
-            'es-MX': LangEsMx,
-            'es-US': LangEsUs,
-            'sv-SE': LangSvSE,
-            'tr-TR': LangTrTr,
-            'cy-GB': LangCyGb
-        }
+    # Language Details
+    supported_lang = list(SUPPORTED_LANG)
+    supported_lang_classes = SUPPORTED_LANG_CLASSES
 
     def supported_languages(self):
         return json.dumps(self.supported_lang)
 
+    def is_supported_language(self, lang):
+        return lang in _index()[4]
+
     def get_language_details(self, lang):
-        if lang not in self.supported_lang:
+        language = _index()[0].get(lang)
+        if language is None:
             raise LanguageException("{} not supported".format(lang))
-        return self.supported_lang_classes.get(lang)()
+        return language
+
+    def get_voice(self, voice):
+        record = _index()[1].get(voice)
+        if record is None:
+            raise LanguageException("Voice {} not supported".format(voice))
+        return record
+
+    def languages_for_voice(self, voice):
+        return self.get_voice(voice).languages
+
+    def voices_for_engine(self, engine):
+        return _index()[2].get(engine, frozenset())
+
+    def voices_for_gender(self, gender):
+        return _index()[3].get(gender, frozenset())
+
+    def validate(self, lang, voice, engine=None):
+        """
+        Verify a language, voice and engine combination
+        @param lang: Language code
+        @param voice: Voice name
+        @param engine: Speech engine. Unknown engines are left to the caller to reject
+        @return: None
+        """
+        error = check_voice(lang, voice, engine)
+        if error is not None:
+            raise error[0](error[1])
+        return None
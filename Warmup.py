@@ -0,0 +1,149 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+
+"""
+
+Pre-warming of Polly connections
+
+The first request on a new connection pays for DNS resolution, the TCP handshake and TLS negotiation, often more
+than the synthesis itself for short texts. Connections are opened ahead of time with DescribeVoices calls, which are
+cheap, made at the same time so each of them takes its own connection from the client pool. The connections stay in
+the pool for the next requests.
+
+A Keepalive thread repeats this while the client is idle, before Polly closes the idle connections.
+
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Filter keeping the DescribeVoices response small
+WARM_LANGUAGE = 'en-US'
+
+
+def warm_client(client, n_connections=1, timeout=10.0):
+    """
+    Open connections of a client pool with concurrent DescribeVoices calls
+    @param client: Polly client
+    @param n_connections: Number of connections to open. Default - 1
+    @param timeout: Seconds to wait for the calls to start together. Default - 10
+    @return: Number of calls that succeeded
+    """
+    n_connections = max(1, int(n_connections))
+    if n_connections == 1:
+        return _describe(client, None, timeout)
+
+    # Calls started together cannot share a connection
+    barrier = threading.Barrier(n_connections)
+    results = [0] * n_connections
+
+    def prime(index):
+        results[index] = _describe(client, barrier, timeout)
+
+    threads = [threading.Thread(target=prime, args=(index,), name='pollytts-warm-{}'.format(index), daemon=True)
+               for index in range(n_connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(results)
+
+
+def _describe(client, barrier, timeout):
+    if barrier is not None:
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass
+    try:
+        client.describe_voices(LanguageCode=WARM_LANGUAGE)
+    except Exception as e:
+        logger.debug('Warming a connection failed - {}'.format(e))
+        return 0
+    return 1
+
+
+class Keepalive:
+    """
+    Background thread warming connections whenever no request has been sent for an interval
+    """
+
+    def __init__(self, warm, last_used, interval=30.0):
+        """
+        Initiate class
+        @param warm: Callable opening the connections
+        @param last_used: Callable returning the time.monotonic() value of the latest request
+        @param interval: Seconds of idleness after which connections are warmed. Default - 30
+        """
+        self.warm = warm
+        self.last_used = last_used
+        self.interval = interval
+        self.warmed = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start the thread, unless it is running
+        @return: None
+        """
+        if not self.running:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='pollytts-keepalive', daemon=True)
+            self._thread.start()
+        return None
+
+    def stop(self, timeout=None):
+        """
+        Stop the thread and wait for it to finish, including a warm up in progress
+        @param timeout: Maximum number of seconds to wait. Default - None (as long as needed)
+        @return: None
+        """
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        return None
+
+    def _run(self):
+        wait = self.interval
+        while not self._stopped.wait(wait):
+            idle = time.monotonic() - self.last_used()
+            if idle < self.interval:
+                # A request kept the connections alive, look again once the interval has passed since it
+                wait = self.interval - idle
+                continue
+            try:
+                self.warm()
+                self.warmed += 1
+            except Exception:
+                logger.exception('Keepalive failed')
+            wait = self.interval
@@ -26,13 +26,30 @@ Library to convert text to speech using Amazon Polly Service
 https://aws.amazon.com/polly/
 """
 import logging
-import tempfile
-import os
-import boto3 as aws
+import io
+import time
+import threading
+from functools import partial
 
 from Voices import Voices
-from Exceptions import (LanguageException, OutputFormatException, EngineException, BotoException, RegionException)
-from botocore.exceptions import ClientError
+from Cache import DiskCache, MemoryCache
+from Request import SynthesisRequest
+from Ssml import text_to_ssml
+from Clients import ClientRegistry, default_registry
+from RateLimiter import default_limiter, backoff_delay
+from Coalescing import Coalescer
+from Metrics import SynthesisMetrics, ObservedStream
+from Streaming import AudioStream, DEFAULT_CHUNK_SIZE, READ_CHUNK_SIZE, save_audio, is_file_object, read_into
+from Splitter import split_ssml, MAX_REQUEST_CHARS
+from Pcm import PcmAudio, pcm_to_array, DEFAULT_PCM_SAMPLE_RATE
+from SpeechMarks import SpeechMarks, SPEECH_MARK_TYPES, DEFAULT_SPEECH_MARK_TYPES
+from Packing import PACKABLE_FORMATS, pack_ssml, mark_times, slice_audio
+from Regions import RegionPool
+from Scheduler import ScheduledBody
+from Warmup import Keepalive, warm_client
+from Deadline import Deadline, DeadlineBody
+from Exceptions import (LanguageException, OutputFormatException, EngineException, BotoException, RegionException,
+                        BufferException, TimeoutException)
 
 
 class PollyTTS:
@@ -40,25 +57,70 @@ class PollyTTS:
     API for Amazon Polly TTS services
     """
 
-    def __init__(self, access_key_id, secret_access_key, region='us-west-1', debug=False):
+    def __init__(self, access_key_id, secret_access_key, region='us-west-1', debug=False, cache_dir=None,
+                 cache_max_bytes=512 * 1024 * 1024, memory_cache_bytes=0, max_workers=10, max_pool_connections=None,
+                 connect_timeout=60, read_timeout=60, tcp_keepalive=False, client_registry=default_registry,
+                 rate_limiter=default_limiter, max_retries=3, retry_base_delay=0.1, retry_max_delay=5.0,
+                 coalesce=True, client=None, observer=None, regions=None, scheduler=None,
+                 priority='default', tenant=None, keepalive_interval=None, keepalive_connections=1):
         """
         Initiate class
         @param access_key_id: AWS Polly access key id
         @param secret_access_key: AWS Polly secret access key
         @param region: AWS region. Default - US-WEST-1
         @param debug: Debugging option. Default - False
+        @param cache_dir: Directory of the persistent audio cache. Default - None (cache disabled)
+        @param cache_max_bytes: Maximum size of the persistent audio cache in bytes. Default - 512 MB
+        @param memory_cache_bytes: Byte budget of the in-memory audio cache. Default - 0 (cache disabled)
+        @param max_workers: Size of the thread pool shared by batch and long text requests. Default - 10
+        @param max_pool_connections: Maximum number of HTTP connections to Polly. Default - max_workers, at least 10
+        @param connect_timeout: Seconds to wait for a connection to Polly. Default - 60
+        @param read_timeout: Seconds to wait for data from Polly. Default - 60
+        @param tcp_keepalive: Enable TCP keepalive on connections to Polly. Default - False
+        @param client_registry: ClientRegistry sharing sessions and clients between instances. None creates a
+        private session and client. Default - registry shared by all instances
+        @param rate_limiter: RateLimiter pacing requests per account, region and engine. None disables client side
+        rate limiting. Default - limiter shared by all instances
+        @param max_retries: Number of times a throttled or failed request is retried. Default - 3
+        @param retry_base_delay: Upper bound in seconds of the jittered delay before the first retry. Default - 0.1
+        @param retry_max_delay: Upper bound in seconds of the jittered delay between retries. Default - 5
+        @param coalesce: Share one Polly call between identical requests in flight at the same time. Requests saving to
+        files are not shared, every caller gets its own file. Default - True
+        @param client: Polly client to use instead of one from the registry, e.g. a stub for tests, or a dictionary
+        of clients per region. Default - None
+        @param observer: Callable, e.g. a SynthesisObserver, receiving the SynthesisMetrics of every request.
+        Default - None (no timings are taken)
+        @param regions: List of AWS regions to route requests between, by latency and health, failing over when a
+        region throttles or fails. Region is used while the latencies are unknown. Default - None (region only)
+        @param scheduler: Scheduler ordering the Polly calls of every instance sharing it by priority and tenant.
+        Default - None (calls are sent as soon as they are made)
+        @param priority: Priority class of the calls of this instance: interactive, default or bulk. Default - default
+        @param tenant: Tenant the calls of this instance are accounted to by the scheduler. Default - None
+        @param keepalive_interval: Seconds without requests after which a background thread warms the connections
+        again, see warm. Default - None (no keepalive)
+        @param keepalive_connections: Number of connections kept warm by the keepalive thread. Default - 1
         """
         self.access_key_id = access_key_id
         self.secret_access_key = secret_access_key
         self.region = region
         self.debug = debug
         self.logger = logging.getLogger(__name__)
-        self.lang = None
-        self.voice = None
-        self.formatted_text = None
-        self.output_format = None
-        self.engine = None
-        self.text_type = None
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.observer = observer
+        self.max_pool_connections = max_pool_connections or max(10, max_workers)
+        self._last_used = time.monotonic()
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tenant = tenant
+        if scheduler is not None:
+            scheduler.level(priority)
+        self._executor = None
+        self._call_executor = None
+        self._executor_lock = threading.Lock()
 
         # AWS Polly Engines
         self.supported_engines = ['standard', 'neural']
@@ -66,6 +128,13 @@ class PollyTTS:
         # AWS Polly Output Format
         self.supported_output_formats = ['json', 'mp3', 'ogg_vorbis', 'pcm']
 
+        # AWS Polly sample rates per output format
+        self.supported_sample_rates = {
+            'mp3': ['8000', '16000', '22050', '24000'],
+            'ogg_vorbis': ['8000', '16000', '22050', '24000'],
+            'pcm': ['8000', '16000']
+        }
+
         # AWS Polly supported regions
         self.supported_regions = ['ap-east-1', 'ap-northeast-1', 'ap-northeast-2', 'ap-south-1', 'ap-southeast-1',
                                   'ap-southeast-2', 'ca-central-1', 'eu-central-1', 'eu-north-1', 'eu-west-1',
@@ -75,24 +144,97 @@ class PollyTTS:
         # AWS Polly supported voices
         self.supported_voices = Voices()
 
+        # Persistent audio cache
+        self.disk_cache = DiskCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+
+        # In-memory cache of hot utterances
+        self.memory_cache = MemoryCache(max_bytes=memory_cache_bytes) if memory_cache_bytes else None
+
+        # Identical requests in flight
+        self.coalescer = Coalescer() if coalesce else None
+
         # Logging
         if self.debug:
             self.logger.setLevel(level=logging.DEBUG)
 
         # Create Polly Client
-        if self.region not in self.supported_regions:
-            raise RegionException("Requested region {} does not support polly".format(self.region))
+        regions = [self.region] + [region for region in regions or () if region != self.region]
+        for region in regions:
+            if region not in self.supported_regions:
+                raise RegionException("Requested region {} does not support polly".format(region))
+
+        if client_registry is None:
+            client_registry = ClientRegistry(max_clients=len(regions))
+
+        def region_client(region):
+            return client_registry.get(
+                self.access_key_id, self.secret_access_key, region,
+                max_pool_connections=self.max_pool_connections,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                tcp_keepalive=tcp_keepalive,
+                # Retries are made by synthesize, which also feeds throttling back into the rate limiter
+                max_attempts=0
+            )
+
+        # Clients are created on first use, requests served from the caches or failing validation never need one
+        clients = client if isinstance(client, dict) else {self.region: client}
+        self.session = None
+        self._client = clients.get(self.region)
+        self._client_lock = threading.Lock()
+        self._region_client = region_client
 
-        self.session = aws.session.Session(
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name=self.region
-        )
-        self.client = self.session.client('polly')
+        # Multi region routing
+        self.region_pool = None
+        if len(regions) > 1:
+            self.region_pool = RegionPool({region: clients.get(region) for region in regions},
+                                          client_factory=self._client_for)
 
-        self.logger.debug('Authorized to polly service region - {}'.format(self.region))
+        # Idle connection keepalive
+        self.keepalive = None
+        if keepalive_interval:
+            self.keepalive = Keepalive(partial(self.warm, keepalive_connections), lambda: self._last_used,
+                                       keepalive_interval)
+            self.keepalive.start()
+
+    @property
+    def client(self):
+        """
+        Polly client of the region, created on first use
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self.session, self._client = self._region_client(self.region)
+                    self.logger.debug('Authorized to polly service region - {}'.format(self.region))
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _client_for(self, region):
+        return self.client if region == self.region else self._region_client(region)[1]
+
+    def warm(self, n_connections=1):
+        """
+        Open connections to Polly ahead of the first requests, creating the client if needed. Connections are opened
+        with concurrent DescribeVoices calls and kept in the client pool. With several regions, every region is
+        warmed.
+        @param n_connections: Number of connections to open per region, at most the connection pool size. Default - 1
+        @return: Number of connections opened
+        """
+        n_connections = min(n_connections, self.max_pool_connections)
+        if self.region_pool is None:
+            clients = [self.client]
+        else:
+            clients = [self.region_pool.client(region) for region in self.region_pool.regions]
+        warmed = sum(warm_client(client, n_connections) for client in clients)
+        self.logger.debug('Warmed {} connections to polly'.format(warmed))
+        return warmed
 
-    def speak(self, text, lang=None, voice=None, engine=None, output_format=None, save_to_file=False, text_type='text'):
+    def speak(self, text, lang=None, voice=None, engine=None, output_format=None, save_to_file=False, text_type='text',
+              sample_rate=None, timeout=None):
         """
         Generate the request body for Polly
         @param text: Text to convert to speech
@@ -101,7 +243,12 @@ class PollyTTS:
         @param voice: Speech output voice (Default: Joanna)
         @param engine: Speech Engine (Default: Standard)
         @param output_format: Speech output file format (Default : MP3)
-        @param save_to_file: Save speech data to a file
+        @param save_to_file: Save speech data to a file. True - in the system temporary directory, a path - in
+        that directory, an open binary file object - into that file
+        @param sample_rate: Audio sample rate in Hz. 8000 or 16000 for pcm, up to 24000 for mp3 and ogg_vorbis
+        (Default: Polly default for the output format)
+        @param timeout: Seconds the call may take, or a Deadline, covering queueing, retries, the HTTP call and
+        reading the audio. TimeoutException is raised once it has passed. (Default: None)
         @return: Return the request for polly
 
         When passing text to speak - you can utilize certain SSML features by wrapping the text around
@@ -134,93 +281,984 @@ class PollyTTS:
         below link and directly provide input in SSML format.
         https://docs.aws.amazon.com/polly/latest/dg/supportedtags.html
         """
-        self.lang = lang
-        self.voice = voice
-        self.engine = engine
-        self.output_format = output_format
-        self.text_type = text_type
+        deadline = Deadline.of(timeout)
+
+        def call(metrics):
+            request = self.prepare_request(text, lang, voice, engine, output_format, text_type, sample_rate,
+                                           metrics=metrics)
+            return self.send_request_to_polly(request, save_to_file, metrics, deadline)
+
+        return self._observed('speak', len(text or ''), call)
+
+    def stream(self, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+               chunk_size=DEFAULT_CHUNK_SIZE, timeout=None):
+        """
+        Generate speech and receive the audio incrementally as it arrives from Polly
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: Speech output file format (Default : MP3)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param chunk_size: Size of the yielded audio chunks in bytes (Default: 16 KB)
+        @param timeout: Seconds the call may take, or a Deadline, until the last chunk has been read.
+        TimeoutException is raised once it has passed. (Default: None)
+        @return: AudioStream yielding audio chunks. Close it, or use it as a context manager, when stopping early
+        """
+        deadline = Deadline.of(timeout)
+        if self.observer is None:
+            request = self.prepare_request(text, lang, voice, engine, output_format, text_type)
+            return self.sent_request_stream_to_polly(request, chunk_size, deadline=deadline)
+
+        metrics = SynthesisMetrics('stream', len(text or ''))
+        request = self._prepare_observed(metrics, text, lang, voice, engine, output_format, text_type)
+        return self.sent_request_stream_to_polly(request, chunk_size, metrics=metrics, deadline=deadline)
+
+    def speak_into(self, buffer, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+                   timeout=None):
+        """
+        Generate speech directly into a caller provided buffer. The response body is read into the buffer without
+        intermediate bytes objects.
+        @param buffer: Writable bytes-like object (bytearray, memoryview, mmap, array...) receiving the audio
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: Speech output file format (Default : MP3)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param timeout: Seconds the call may take, or a Deadline, as for speak. (Default: None)
+        @return: Number of bytes written to the buffer. BufferException is raised when the audio does not fit.
+        """
+        return len(self._speak_view('speak_into', memoryview(buffer).cast('B'), text, lang, voice, engine,
+                                    output_format, text_type, timeout))
+
+    def speak_view(self, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+                   timeout=None):
+        """
+        Generate speech into a single buffer sized to the audio, avoiding the copies made when joining chunks
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: Speech output file format (Default : MP3)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param timeout: Seconds the call may take, or a Deadline, as for speak. (Default: None)
+        @return: memoryview of the audio. Views of cached audio are read-only.
+        """
+        return self._speak_view('speak_view', None, text, lang, voice, engine, output_format, text_type, timeout)
+
+    def _speak_view(self, operation, buffer, text, lang, voice, engine, output_format, text_type, timeout=None):
+        deadline = Deadline.of(timeout)
+
+        def call(metrics):
+            request = self.prepare_request(text, lang, voice, engine, output_format, text_type, metrics=metrics)
+            return self.receive_into(request, buffer, metrics, deadline)
+
+        return self._observed(operation, len(text or ''), call)
+
+    def receive_into(self, request, buffer=None, metrics=None, deadline=None):
+        """
+        Send a prepared request and read the audio into a buffer
+        @param request: Prepared SynthesisRequest
+        @param buffer: Writable bytes-like object receiving the audio. Default - None (a buffer sized to the audio)
+        @param metrics: SynthesisMetrics receiving the timings of the request. Default - None
+        @param deadline: Deadline of the call. Default - None
+        @return: memoryview of the audio
+        """
+        key = None
+        if self.memory_cache is not None or self.disk_cache is not None:
+            key = request.cache_key(self.region)
+            audio = self.get_cached_audio(key, metrics)
+            if audio is not None:
+                self.logger.debug('Audio served from cache - {}'.format(key))
+                if metrics is not None:
+                    metrics.audio_bytes = len(audio)
+                if buffer is None:
+                    return memoryview(audio)
+                view = memoryview(buffer).cast('B')
+                if len(audio) > len(view):
+                    raise BufferException("Audio does not fit in the {} byte buffer".format(len(view)))
+                view[:len(audio)] = audio
+                return view[:len(audio)]
+
+        if metrics is not None:
+            metrics.cache = 'miss' if key is not None else None
+        response = self.synthesize(request, metrics, deadline)
+        size = response['ResponseMetadata'].get('HTTPHeaders', {}).get('content-length')
+        if metrics is None:
+            audio = read_into(response['AudioStream'], buffer, int(size) if size else None)
+        else:
+            started = time.perf_counter()
+            audio = read_into(response['AudioStream'], buffer, int(size) if size else None)
+            metrics.read_seconds = time.perf_counter() - started
+            metrics.audio_bytes = len(audio)
+        if key is not None:
+            # Caching needs its own copy, the buffer belongs to the caller
+            self.put_cached_audio(key, audio.tobytes())
+        return audio
+
+    def speak_pcm(self, text, lang=None, voice=None, engine=None, text_type='text', sample_rate=None, timeout=None):
+        """
+        Generate pcm speech as a NumPy array. Requires NumPy.
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param sample_rate: 8000 or 16000 Hz (Default: 16000)
+        @param timeout: Seconds the call may take, or a Deadline, as for speak. (Default: None)
+        @return: PcmAudio holding int16 samples read without copying, and their sample rate
+        """
+        deadline = Deadline.of(timeout)
+
+        def call(metrics):
+            request = self.prepare_request(text, lang, voice, engine, 'pcm', text_type, sample_rate, metrics=metrics)
+            audio = self.receive_into(request, metrics=metrics, deadline=deadline)
+            return PcmAudio(pcm_to_array(audio), request.sample_rate or DEFAULT_PCM_SAMPLE_RATE)
+
+        return self._observed('speak_pcm', len(text or ''), call)
+
+    def speak_pcm_many(self, items, sample_rate=None, max_workers=None, timeout=None):
+        """
+        Generate pcm speech for many texts concurrently, as speak_many. Requires NumPy.
+        @param items: Iterable of texts or of dictionaries with the speak parameters text, lang, voice, engine and
+        text_type
+        @param sample_rate: 8000 or 16000 Hz (Default: 16000)
+        @param max_workers: Maximum number of requests in flight for this batch (Default: max_workers of the
+        instance)
+        @param timeout: Seconds the whole batch may take, or a Deadline, as for speak_many. (Default: None)
+        @return: List with, in the order of items, the PcmAudio of each item or the exception raised for it
+        """
+        items = [dict({'text': item} if isinstance(item, str) else item, output_format='pcm', sample_rate=sample_rate)
+                 for item in items]
+        rate = int(sample_rate or DEFAULT_PCM_SAMPLE_RATE)
+        return [result if isinstance(result, Exception) else PcmAudio(pcm_to_array(result), rate)
+                for result in self.speak_many(items, max_workers, timeout=timeout)]
+
+    def speech_marks(self, text, lang=None, voice=None, engine=None, text_type='text',
+                     mark_types=DEFAULT_SPEECH_MARK_TYPES, timeout=None):
+        """
+        Get the speech marks of a text, describing when each sentence, word, SSML mark or viseme is spoken
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param mark_types: Iterable of sentence, ssml, viseme and word (Default: sentence and word)
+        @param timeout: Seconds the call may take, or a Deadline, as for speak. (Default: None)
+        @return: SpeechMarks, parsed on first access
+        """
+        deadline = Deadline.of(timeout)
+
+        def call(metrics):
+            request = self.prepare_request(text, lang, voice, engine, 'json', text_type,
+                                           speech_mark_types=mark_types, metrics=metrics)
+            return SpeechMarks(self.receive_into(request, metrics=metrics, deadline=deadline))
+
+        return self._observed('speech_marks', len(text or ''), call)
+
+    def speak_with_marks(self, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+                         mark_types=DEFAULT_SPEECH_MARK_TYPES, sample_rate=None, timeout=None):
+        """
+        Generate speech and get its speech marks. Polly returns audio and marks in separate requests, both are sent
+        at the same time.
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: Speech output file format (Default : MP3)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param mark_types: Iterable of sentence, ssml, viseme and word (Default: sentence and word)
+        @param sample_rate: Audio sample rate in Hz (Default: Polly default for the output format)
+        @param timeout: Seconds both requests may take, or a Deadline, as for speak. (Default: None)
+        @return: Tuple of the audio bytes and its SpeechMarks
+        """
+        # A deadline is always used so the marks request can be stopped when the audio request fails
+        deadline = Deadline.of(timeout) or Deadline()
+        marks = self.executor.submit(self.speech_marks, text, lang, voice, engine, text_type, mark_types, deadline)
+        try:
+            audio = self.speak(text, lang, voice, engine, output_format, text_type=text_type, sample_rate=sample_rate,
+                               timeout=deadline)
+        except BaseException:
+            marks.cancel()
+            deadline.cancel()
+            raise
+        return audio, marks.result()
+
+    def speak_long(self, text, lang=None, voice=None, engine=None, output_format=None, save_to_file=False,
+                   text_type='text', max_workers=4, max_chunk_chars=MAX_REQUEST_CHARS, timeout=None):
+        """
+        Generate speech for text longer than a single Polly request accepts.
+
+        The SSML is split at sentence boundaries into requests of at most max_chunk_chars characters, the requests
+        are synthesized concurrently and the audio is joined in order. Elements open at a split are closed and
+        reopened so every request is a valid SSML document. mp3 and pcm audio is joined frame for frame, ogg_vorbis
+        audio is returned as a chained Ogg stream.
+        @param text: Text to convert to speech. Supports the same tags as speak
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: Speech output file format (Default : MP3)
+        @param save_to_file: Save speech data to a file. True, a directory or an open binary file object, as for speak
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param max_workers: Number of requests synthesized concurrently on the shared thread pool (Default: 4)
+        @param max_chunk_chars: Maximum characters sent in a single request (Default: 3000)
+        @param timeout: Seconds the whole call may take, or a Deadline. TimeoutException is raised once it has
+        passed, the requests of the other parts are then stopped. (Default: None)
+        @return: If save_to_file is true - location of the audio file will be returned. If false - the audio in raw
+        byte format will be returned.
+        """
+        # A deadline is always used so an interrupted call can stop the requests of the other parts
+        deadline = Deadline.of(timeout) or Deadline()
+        return self._observed('speak_long', len(text or ''), lambda metrics: self._speak_long(
+            text, lang, voice, engine, output_format, save_to_file, text_type, max_workers, max_chunk_chars, metrics,
+            deadline))
+
+    def _speak_long(self, text, lang, voice, engine, output_format, save_to_file, text_type, max_workers,
+                    max_chunk_chars, metrics=None, deadline=None):
+        request = self.prepare_request(text, lang, voice, engine, output_format, text_type, metrics=metrics)
+
+        key = request.cache_key(self.region)
+        if self.memory_cache is not None or self.disk_cache is not None:
+            audio = self.get_cached_audio(key, metrics)
+            if audio is not None:
+                self.logger.debug('Audio served from cache - {}'.format(key))
+                return self._deliver(audio, key, save_to_file, request.output_format, metrics)
+
+        chunks = split_ssml(request.formatted_text, max_chunk_chars)
+        self.logger.debug('Long text split into {} requests'.format(len(chunks)))
+
+        if metrics is not None:
+            fetching = time.perf_counter()
+
+        def synthesize_chunk(chunk):
+            return self.synthesize(request.replace(formatted_text=chunk), deadline=deadline)['AudioStream'].read()
+
+        if len(chunks) == 1:
+            audio = synthesize_chunk(chunks[0])
+        else:
+            audio = b''.join(self._map_bounded(synthesize_chunk, chunks, max_workers, deadline))
+
+        if metrics is not None:
+            metrics.read_seconds = time.perf_counter() - fetching
+        self.put_cached_audio(key, audio)
+        return self._deliver(audio, key, save_to_file, request.output_format, metrics)
+
+    def speak_many(self, items, max_workers=None, save_to_file=False, timeout=None):
+        """
+        Generate speech for many texts concurrently.
+
+        Requests are validated and converted to SSML up front, then sent to Polly on the thread pool shared by
+        this instance (and its pooled client). Identical requests in a batch are synthesized only once.
+        @param items: Iterable of texts or of dictionaries with the speak parameters text, lang, voice, engine,
+        output_format and text_type
+        @param max_workers: Maximum number of requests in flight for this batch (Default: max_workers of the
+        instance)
+        @param save_to_file: Save speech data to files. True or a directory, as for speak
+        @param timeout: Seconds the whole batch may take, or a Deadline, which can also be cancelled from another
+        thread. Items not done by then receive a TimeoutException. (Default: None)
+        @return: List with, in the order of items, the audio bytes (or file location) of each item or the exception
+        raised for it. A failing item does not abort the batch. When the batch is interrupted, requests in flight
+        are stopped and their connections released.
+        """
+        # A deadline is always used so an interrupted batch can stop the requests in flight
+        deadline = Deadline.of(timeout) or Deadline()
+        results = []
+        positions = {}
+        observed = {} if self.observer is not None else None
+        for position, item in enumerate(items):
+            results.append(None)
+            if isinstance(item, str):
+                item = {'text': item}
+            metrics = None
+            if observed is not None:
+                metrics = SynthesisMetrics('speak_many', len(item.get('text') or ''))
+            try:
+                request = self.prepare_request(metrics=metrics, **item)
+            except Exception as e:
+                results[position] = e
+                if metrics is not None:
+                    metrics.error = type(e).__name__
+                    self._report(metrics)
+                continue
+            positions.setdefault(request, []).append(position)
+            if metrics is not None:
+                # Duplicates in the batch are synthesized once and reported once
+                observed.setdefault(request, metrics)
+
+        def send(request):
+            metrics = observed[request] if observed is not None else None
+            try:
+                return self.send_request_to_polly(request, save_to_file, metrics=metrics, deadline=deadline)
+            except Exception as e:
+                if metrics is not None:
+                    metrics.error = type(e).__name__
+                return e
+            finally:
+                if metrics is not None:
+                    self._report(metrics)
+
+        requests = list(positions)
+        for request, result in zip(requests, self._map_bounded(send, requests, max_workers or self.max_workers,
+                                                               deadline)):
+            for position in positions[request]:
+                results[position] = result
+        return results
+
+    def speak_packed(self, texts, lang=None, voice=None, engine=None, output_format='pcm', text_type='text',
+                     sample_rate=None, max_chunk_chars=MAX_REQUEST_CHARS, max_workers=None, timeout=None):
+        """
+        Generate speech for many short texts with few requests.
+
+        The texts are packed into SSML documents of at most max_chunk_chars characters with a mark before each
+        text. Every document is synthesized once, its speech marks are requested at the same time, and the audio is
+        cut at the marks. pcm audio is cut at the sample, mp3 audio at the closest frame boundary. Packed audio is
+        not cached.
+        @param texts: Iterable of texts sharing the voice parameters below
+        @param lang: Speech output language (Default: en-US)
+        @param voice: Speech output voice (Default: Joanna)
+        @param engine: Speech Engine (Default: Standard)
+        @param output_format: pcm or mp3 (Default: pcm)
+        @param text_type: Type can be text or SSML. (Default: Text)
+        @param sample_rate: Audio sample rate in Hz (Default: Polly default for the output format)
+        @param max_chunk_chars: Maximum characters sent in a single request (Default: 3000)
+        @param max_workers: Maximum number of requests in flight (Default: max_workers of the instance)
+        @param timeout: Seconds the whole call may take, or a Deadline. TimeoutException is raised once it has
+        passed, the other requests are then stopped. (Default: None)
+        @return: List of the audio bytes of each text, in the order of texts
+        """
+        if output_format not in PACKABLE_FORMATS:
+            raise OutputFormatException("Packing requires one of the output formats {}".format(
+                ', '.join(PACKABLE_FORMATS)))
+
+        texts = list(texts)
+        # A deadline is always used so an interrupted call can stop the other requests
+        deadline = Deadline.of(timeout) or Deadline()
+        input_chars = sum(len(text or '') for text in texts)
+        return self._observed('speak_packed', input_chars, lambda metrics: self._speak_packed(
+            texts, lang, voice, engine, output_format, text_type, sample_rate, max_chunk_chars, max_workers, metrics,
+            deadline))
+
+    def _speak_packed(self, texts, lang, voice, engine, output_format, text_type, sample_rate, max_chunk_chars,
+                      max_workers, metrics=None, deadline=None):
+        requests = [self.prepare_request(text, lang, voice, engine, output_format, text_type, sample_rate)
+                    for text in texts]
+        if not requests:
+            return []
+        if metrics is not None:
+            template = requests[0]
+            metrics.lang, metrics.voice, metrics.engine = template.lang, template.voice, template.engine
+            metrics.output_format = template.output_format
+            fetching = time.perf_counter()
+        packs = pack_ssml([request.formatted_text for request in requests], max_chunk_chars)
+        self.logger.debug('{} texts packed into {} requests'.format(len(requests), len(packs)))
+
+        template = requests[0]
+
+        def fetch(task):
+            document, marks = task
+            if marks:
+                request = template.replace(formatted_text=document, output_format='json', sample_rate=None,
+                                           speech_mark_types=('ssml',))
+            else:
+                request = template.replace(formatted_text=document)
+            return self.synthesize(request, deadline=deadline)['AudioStream'].read()
+
+        # Audio and marks of every pack are requested side by side
+        tasks = [(document, marks) for document, _ in packs for marks in (False, True)]
+        responses = self._map_bounded(fetch, tasks, max_workers or self.max_workers, deadline)
+
+        clips = [None] * len(requests)
+        rate = template.sample_rate or DEFAULT_PCM_SAMPLE_RATE
+        for number, (_, positions) in enumerate(packs):
+            audio, marks = responses[2 * number], SpeechMarks(responses[2 * number + 1])
+            times = mark_times(marks, positions)
+            if times is None:
+                self.logger.debug('Speech marks missing, synthesizing {} texts one by one'.format(len(positions)))
+                for position in positions:
+                    clips[position] = self.synthesize(requests[position], deadline=deadline)['AudioStream'].read()
+                continue
+            for position, clip in zip(positions, slice_audio(audio, times, output_format, rate)):
+                clips[position] = clip
+
+        if metrics is not None:
+            metrics.read_seconds = time.perf_counter() - fetching
+            metrics.audio_bytes = sum(len(clip) for clip in clips)
+        return clips
+
+    @property
+    def executor(self):
+        """
+        Thread pool shared by batch and long text requests, created on first use
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='pollytts')
+        return self._executor
+
+    def _map_bounded(self, function, values, max_in_flight, deadline=None):
+        """
+        Run a function over values on the shared thread pool with a bounded number of calls in flight
+        @param function: Callable to run
+        @param values: List of arguments
+        @param max_in_flight: Maximum number of calls submitted at once
+        @param deadline: Deadline of the calls, cancelled when a call fails or the caller is interrupted.
+        Default - None
+        @return: List of results in the order of values
+        """
+        slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        futures = []
+        try:
+            for value in values:
+                slots.acquire()
+                future = self.executor.submit(function, value)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+            return [future.result() for future in futures]
+        except BaseException:
+            # The results are abandoned, stop the calls still running and release their connections
+            for future in futures:
+                future.cancel()
+            if deadline is not None:
+                deadline.cancel()
+            raise
+
+    def _observed(self, operation, input_chars, call):
+        """
+        Run a call, recording its SynthesisMetrics and reporting them to the observer when one is set
+        @param operation: Name of the API method, as reported in the metrics
+        @param input_chars: Number of characters of text of the call
+        @param call: Callable receiving the SynthesisMetrics to fill in, None without an observer
+        @return: Result of call
+        """
+        if self.observer is None:
+            return call(None)
+
+        metrics = SynthesisMetrics(operation, input_chars)
+        try:
+            return call(metrics)
+        except Exception as e:
+            metrics.error = type(e).__name__
+            raise
+        finally:
+            self._report(metrics)
+
+    def _prepare_observed(self, metrics, text, lang=None, voice=None, engine=None, output_format=None,
+                          text_type='text'):
+        """
+        Prepare a request, reporting the metrics when it fails
+        @return: Validated SynthesisRequest
+        """
+        try:
+            return self.prepare_request(text, lang, voice, engine, output_format, text_type, metrics=metrics)
+        except Exception as e:
+            metrics.error = type(e).__name__
+            self._report(metrics)
+            raise
+
+    def _report(self, metrics):
+        """
+        Pass the metrics of a finished request to the observer. Failures of the observer are logged, not raised.
+        @param metrics: SynthesisMetrics of the request
+        @return: None
+        """
+        if metrics.total_seconds is None:
+            metrics.total_seconds = time.perf_counter() - metrics.started
+        try:
+            self.observer(metrics)
+        except Exception:
+            self.logger.exception('Synthesis observer failed')
+        return None
+
+    def close(self):
+        """
+        Release resources held by the instance
+        @return: None
+        """
+        if self.keepalive is not None:
+            self.keepalive.stop()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            if self._call_executor is not None:
+                # Calls abandoned at their deadline are not waited for
+                self._call_executor.shutdown(wait=False)
+                self._call_executor = None
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _deliver(self, audio, name, save_to_file, output_format, metrics=None):
+        """
+        Return audio as bytes or write it to a file
+        @param audio: Audio bytes
+        @param name: File name, without extension, used when saving
+        @param save_to_file: True, a directory or an open binary file object to write the audio to. False returns
+        the audio bytes
+        @param output_format: Output format of the audio, determining the file extension
+        @param metrics: SynthesisMetrics of the request, None when not observed
+        @return: Location of the audio file (or the file object) or the audio bytes
+        """
+        if metrics is not None:
+            metrics.audio_bytes = len(audio)
+        if save_to_file:
+            return save_audio((audio,), save_to_file, name, output_format, metrics)
+        return audio
+
+    def prepare_request(self, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+                        sample_rate=None, speech_mark_types=None, metrics=None):
+        """
+        Resolve defaults, validate parameters and build the SSML for a request
+        @param text: Text to convert to speech
+        @param lang: Speech output language
+        @param voice: Speech output voice
+        @param engine: Speech Engine
+        @param output_format: Speech output file format
+        @param text_type: Type can be text or SSML
+        @param sample_rate: Audio sample rate in Hz. Default - None (Polly default for the output format)
+        @param speech_mark_types: Speech mark types returned with the json output format. Default - sentence and word
+        @param metrics: SynthesisMetrics receiving the validation and SSML conversion times. Default - None
+        @return: Validated SynthesisRequest
+        """
+        if metrics is not None:
+            started = time.perf_counter()
 
         if not text:
             raise LanguageException("Text is not provided for speech conversion")
 
-        if not self.voice and not self.lang:
-            self.lang = 'en-US'
-            self.voice = 'Joanna'
+        if not voice and not lang:
+            lang = 'en-US'
+            voice = 'Joanna'
+
+        if not engine:
+            engine = 'standard'
+
+        if not output_format:
+            output_format = 'mp3'
 
-        if not self.engine:
-            self.engine = 'standard'
+        if lang and not voice:
+            voice = self.supported_voices.get_language_details(lang).default
 
-        if not self.output_format:
-            self.output_format = 'mp3'
+        if sample_rate:
+            sample_rate = str(sample_rate)
 
-        if self.lang and not self.voice:
-            self.voice = self.supported_voices.get_language_details(self.lang).default
+        if speech_mark_types:
+            speech_mark_types = tuple(sorted(set(speech_mark_types)))
+        elif output_format == 'json':
+            speech_mark_types = DEFAULT_SPEECH_MARK_TYPES
+
+        request = SynthesisRequest(text, lang, voice, engine, output_format, text_type, sample_rate=sample_rate,
+                                   speech_mark_types=speech_mark_types)
+
+        if metrics is not None:
+            metrics.lang, metrics.voice, metrics.engine, metrics.output_format = lang, voice, engine, output_format
 
         # Validate input parameters
-        self.validate_request()
+        self.validate_request(request)
+
+        if metrics is not None:
+            validated = time.perf_counter()
+            metrics.validation_seconds = validated - started
 
         # Reformat the input text to SSML format
-        if self.text_type.upper() == 'TEXT':
-            self.convert_text_to_ssml(text)
+        if text_type.upper() == 'TEXT':
+            request = request.replace(formatted_text=self.convert_text_to_ssml(text))
         else:
-            self.formatted_text = text
+            request = request.replace(formatted_text=text)
+
+        if metrics is not None:
+            metrics.ssml_seconds = time.perf_counter() - validated
 
-        print(self.formatted_text)
         # Log parameters determined for use.
-        self.logger.debug('Language - {}, Voice - {}, Engine - {}, Output Format - {}'.format(self.lang,
-                                                                                              self.voice,
-                                                                                              self.engine,
-                                                                                              self.output_format))
+        self.logger.debug('Language - {}, Voice - {}, Engine - {}, Output Format - {}'.format(request.lang,
+                                                                                              request.voice,
+                                                                                              request.engine,
+                                                                                              request.output_format))
 
-        return self.send_request_to_polly(save_to_file)
+        return request
 
-    def validate_request(self):
+    def validate_request(self, request):
         """
         Verify all the required parameters are valid for polly service
+        @param request: SynthesisRequest to verify
         @return: None
         """
-        if self.voice and not self.lang:
-            raise LanguageException("Voice defined witout defining language!")
-        if self.lang is not None and self.lang not in self.supported_voices.supported_languages():
-            raise LanguageException("Requested language {} not available!".format(self.lang))
-        if self.voice not in self.supported_voices.get_language_details(self.lang).voices:
-            raise LanguageException("Requested language {} does not have voice {}!".format(self.lang, self.voice))
-        if self.output_format not in self.supported_output_formats:
-            raise OutputFormatException("Requested output format {} is not supported".format(self.output_format))
-        if self.engine not in self.supported_engines:
-            raise EngineException("Requested engine {} is not supported".format(self.engine))
+        self.supported_voices.validate(request.lang, request.voice, request.engine)
+        if request.output_format not in self.supported_output_formats:
+            raise OutputFormatException("Requested output format {} is not supported".format(request.output_format))
+        if request.engine not in self.supported_engines:
+            raise EngineException("Requested engine {} is not supported".format(request.engine))
+        if request.sample_rate is not None and \
+                request.sample_rate not in self.supported_sample_rates.get(request.output_format, ()):
+            raise OutputFormatException("Sample rate {} is not supported for output format {}".format(
+                request.sample_rate, request.output_format))
+        if request.speech_mark_types is not None:
+            if request.output_format != 'json':
+                raise OutputFormatException("Speech marks require the json output format")
+            for mark_type in request.speech_mark_types:
+                if mark_type not in SPEECH_MARK_TYPES:
+                    raise OutputFormatException("Requested speech mark type {} is not supported".format(mark_type))
 
         return None
 
-    def send_request_to_polly(self, save_to_file=False):
+    def send_request_to_polly(self, request, save_to_file=False, metrics=None, deadline=None):
         """
         Send formatted text as request and return the response.
-        @param save_to_file: If True - output will be written to a temporary file
-        @return: If save_to_file is true - location of the audio file will be returned. If false - the audio in raw
-        byte format will be returned.
+        @param request: Prepared SynthesisRequest
+        @param save_to_file: True, a directory or an open binary file object to write the audio to, as for speak
+        @param metrics: SynthesisMetrics receiving the timings of the request. Default - None
+        @param deadline: Deadline of the call. Default - None
+        @return: If save_to_file is set - location of the audio file (or the file object) will be returned. If false -
+        the audio in raw byte format will be returned.
+        """
+        if deadline is not None:
+            deadline.check('queueing the request')
+        key = None
+        if self.memory_cache is not None or self.disk_cache is not None:
+            key = request.cache_key(self.region)
+            if save_to_file and self.disk_cache is not None and self.memory_cache is None:
+                cached_path = self.disk_cache.get_path(key)
+                if cached_path is not None:
+                    self.logger.debug('Audio served from cache - {}'.format(key))
+                    if metrics is not None:
+                        metrics.cache = 'disk'
+                    try:
+                        with open(cached_path, 'rb') as cached:
+                            return save_audio(iter(lambda: cached.read(READ_CHUNK_SIZE), b''), save_to_file, key,
+                                              request.output_format, metrics)
+                    except FileNotFoundError:
+                        # Evicted by another process since the lookup
+                        pass
+            audio = self.get_cached_audio(key, metrics)
+            if audio is not None:
+                self.logger.debug('Audio served from cache - {}'.format(key))
+                return self._deliver(audio, key, save_to_file, request.output_format, metrics)
+
+        # Files are not shared, a caller moving or deleting its file would take it away from the others
+        if self.coalescer is None or save_to_file:
+            return self._fetch_from_polly(request, key, save_to_file, metrics, deadline)
+
+        def fetch():
+            return self._fetch_from_polly(request, key, save_to_file, metrics, deadline)
+
+        if metrics is None:
+            return self._coalesce(request, fetch, deadline)
+
+        # The leader overwrites the outcome, callers receiving the result of another call keep this one
+        metrics.cache = 'coalesced'
+        result = self._coalesce(request, fetch, deadline)
+        if metrics.audio_bytes is None:
+            metrics.audio_bytes = len(result)
+        return result
+
+    def _coalesce(self, key, fetch, deadline):
+        """
+        Share the call of fetch with identical requests in flight
+        @return: Result of fetch, or of the identical request
+        """
+        led = []
+
+        def lead():
+            led.append(True)
+            return fetch()
+
+        try:
+            return self.coalescer.do(key, lead, None if deadline is None else deadline.remaining())
+        except TimeoutException:
+            if led or (deadline is not None and deadline.expired()):
+                raise
+            # The identical request ran out of its own time or was cancelled, this one was not
+            return fetch()
+
+    def _fetch_from_polly(self, request, key, save_to_file, metrics=None, deadline=None):
+        """
+        Synthesize a request that missed the caches and fill the caches with the audio
+        @param request: Prepared SynthesisRequest
+        @param key: Cache key of the request, None when caching is disabled
+        @param save_to_file: True, a directory or an open binary file object to write the audio to
+        @param metrics: SynthesisMetrics receiving the timings of the request. Default - None
+        @param deadline: Deadline of the call. Default - None
+        @return: Location of the audio file (or the file object) or the audio bytes
+        """
+        if metrics is not None:
+            metrics.cache = 'miss' if key is not None else None
+        response = self.synthesize(request, metrics, deadline)
+        if response['ResponseMetadata']['HTTPStatusCode'] == 200:
+            if save_to_file:
+                chunks = AudioStream(response['AudioStream'], READ_CHUNK_SIZE)
+                to_file_object = is_file_object(save_to_file)
+                if self.disk_cache is not None and to_file_object:
+                    # Audio written to a caller's file object cannot be read back, it is cached on the way
+                    chunks = self.disk_cache.tee(key, chunks)
+                result = save_audio(chunks, save_to_file, response['ResponseMetadata']['RequestId'],
+                                    request.output_format, metrics)
+                if self.disk_cache is not None and not to_file_object:
+                    self.disk_cache.put_file(key, result)
+                return result
+            if metrics is None:
+                audio = response['AudioStream'].read()
+            else:
+                started = time.perf_counter()
+                audio = response['AudioStream'].read()
+                metrics.read_seconds = time.perf_counter() - started
+                metrics.audio_bytes = len(audio)
+            if key is not None:
+                self.put_cached_audio(key, audio)
+            return audio
+
+    def sent_request_stream_to_polly(self, request, chunk_size=DEFAULT_CHUNK_SIZE, metrics=None, deadline=None):
+        """
+        Send formatted text as request and stream the audio of the response.
+        @param request: Prepared SynthesisRequest
+        @param chunk_size: Size of the yielded audio chunks in bytes
+        @param metrics: SynthesisMetrics reported to the observer once the stream is closed. Default - None
+        @param deadline: Deadline by which the whole stream has to be read. Default - None
+        @return: AudioStream yielding audio chunks as they are received. Time to first byte is available as
+        time_to_first_byte once the first chunk has been read.
+        """
+        if metrics is None:
+            return self._stream_request(request, chunk_size, deadline=deadline)
+
+        sent = time.perf_counter()
+        try:
+            audio = self._stream_request(request, chunk_size, metrics, deadline)
+        except Exception as e:
+            metrics.error = type(e).__name__
+            self._report(metrics)
+            raise
+        return ObservedStream(audio, metrics, self._report, sent)
+
+    def _stream_request(self, request, chunk_size, metrics=None, deadline=None):
+        if deadline is not None:
+            deadline.check('queueing the request')
+        key = None
+        if self.memory_cache is not None or self.disk_cache is not None:
+            key = request.cache_key(self.region)
+            audio = self.get_cached_audio(key, metrics)
+            if audio is not None:
+                self.logger.debug('Audio served from cache - {}'.format(key))
+                return AudioStream(io.BytesIO(audio), chunk_size)
+
+        # Readers of a shared stream would be cut off by the deadline of the caller reading it
+        if self.coalescer is None or deadline is not None:
+            return self._open_polly_stream(request, key, chunk_size, metrics, deadline)
+        if metrics is None:
+            return self.coalescer.stream((request, chunk_size),
+                                         lambda: self._open_polly_stream(request, key, chunk_size))
+        metrics.cache = 'coalesced'
+        return self.coalescer.stream((request, chunk_size),
+                                     lambda: self._open_polly_stream(request, key, chunk_size, metrics))
+
+    def _open_polly_stream(self, request, key, chunk_size, metrics=None, deadline=None):
+        """
+        Synthesize a request that missed the caches, filling the caches once the stream has been read
+        @param request: Prepared SynthesisRequest
+        @param key: Cache key of the request, None when caching is disabled
+        @param chunk_size: Size of the yielded audio chunks in bytes
+        @param metrics: SynthesisMetrics receiving the timings of the request. Default - None
+        @param deadline: Deadline of the call. Default - None
+        @return: AudioStream yielding audio chunks
+        """
+        if metrics is not None:
+            metrics.cache = 'miss' if key is not None else None
+        started = time.monotonic()
+        response = self.synthesize(request, metrics, deadline)
+        if response['ResponseMetadata']['HTTPStatusCode'] == 200:
+            on_complete = None if key is None else partial(self.put_cached_audio, key)
+            return AudioStream(response['AudioStream'], chunk_size, started=started, on_complete=on_complete)
+
+    def synthesize(self, request, metrics=None, deadline=None):
+        """
+        Call Polly for a prepared request.
+
+        Requests are paced by the rate limiter. Throttled requests slow the limiter down, retryable failures are
+        retried up to max_retries times with jittered exponential backoff. With several regions, a request that is
+        throttled or fails in one region is sent to the next best region before backing off. With a scheduler, every
+        attempt waits for its turn, which is held until the response body has been read or closed. With a deadline,
+        no step waits past it, a backoff that would end after it is not started, and the response body fails once
+        it has passed.
+        @param request: Prepared SynthesisRequest
+        @param metrics: SynthesisMetrics receiving the queueing time and time to first byte. Default - None
+        @param deadline: Deadline of the call. Default - None
+        @return: Polly SynthesizeSpeech response
+        """
+        # Imported once a request is sent, botocore is loaded with the client by then
+        from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+        bucket = None
+        if self.region_pool is None:
+            region, client = self.region, self.client
+            if self.rate_limiter is not None:
+                bucket = self.rate_limiter.bucket(self.access_key_id, region, request.engine)
+
+        parameters = {
+            'Engine': request.engine,
+            'VoiceId': request.voice,
+            'OutputFormat': request.output_format,
+            'Text': request.formatted_text,
+            'TextType': 'ssml'
+        }
+        if request.sample_rate is not None:
+            parameters['SampleRate'] = request.sample_rate
+        if request.speech_mark_types is not None:
+            parameters['SpeechMarkTypes'] = list(request.speech_mark_types)
+
+        release = None
+        if self.scheduler is not None:
+            release = partial(self.scheduler.release, self.priority)
+            if metrics is not None:
+                metrics.priority, metrics.tenant = self.priority, self.tenant
+
+        attempt = 0
+        tried = set()
+        while True:
+            if deadline is not None:
+                deadline.check('sending the request')
+            if self.region_pool is not None:
+                stats = self.region_pool.choose(request.voice, request.engine, tried)
+                if stats is None:
+                    raise EngineException("No region offers voice {} with engine {}".format(request.voice,
+                                                                                           request.engine))
+                region, client = stats.region, self.region_pool.client(stats.region)
+                if self.rate_limiter is not None:
+                    bucket = self.rate_limiter.bucket(self.access_key_id, region, request.engine)
+            if self.scheduler is not None:
+                waited = self.scheduler.acquire(self.priority, self.tenant, len(request.formatted_text),
+                                                None if deadline is None else deadline.remaining())
+                if metrics is not None:
+                    metrics.add_queue_time(waited)
+            if bucket is not None:
+                waiting = time.perf_counter()
+                acquired = bucket.acquire(None if deadline is None else deadline.remaining())
+                if metrics is not None:
+                    metrics.add_queue_time(time.perf_counter() - waiting)
+                if not acquired:
+                    if release is not None:
+                        release()
+                    raise deadline.exception('waiting for the rate limiter')
+            if metrics is not None:
+                sent = time.perf_counter()
+            # Region latency is measured from here, time spent waiting locally says nothing about the region
+            started = self._last_used = time.monotonic()
+            try:
+                if deadline is None or deadline.remaining() is None:
+                    response = client.synthesize_speech(**parameters)
+                else:
+                    response = self._call_polly(client, parameters, deadline)
+            except ClientError as e:
+                error = BotoException(e.response['Error']['Code'], e.response['Error']['Message'],
+                                      http_status=e.response.get('ResponseMetadata', {}).get('HTTPStatusCode'))
+            except (BotoConnectionError, HTTPClientError) as e:
+                error = BotoException('ConnectionError', str(e), retryable=True)
+            except BaseException:
+                if release is not None:
+                    release()
+                raise
+            else:
+                if metrics is not None:
+                    metrics.time_to_first_byte = time.perf_counter() - sent
+                if bucket is not None:
+                    bucket.on_success()
+                if self.region_pool is not None:
+                    self.region_pool.record_success(region, time.monotonic() - started)
+                if release is not None:
+                    response['AudioStream'] = ScheduledBody(response['AudioStream'], release)
+                if deadline is not None:
+                    response['AudioStream'] = DeadlineBody(response['AudioStream'], deadline)
+                return response
+
+            if release is not None:
+                # The turn is given back before failing over or backing off
+                release()
+            if bucket is not None and error.throttled:
+                bucket.on_throttle()
+            if self.region_pool is not None and \
+                    self.region_pool.record_error(region, error, request.voice, request.engine):
+                tried.add(region)
+                if any(self.region_pool.offers(other, request.voice, request.engine)
+                       for other in self.region_pool.regions if other not in tried):
+                    self.logger.debug('Failing over from {} after {}'.format(region, error.code))
+                    continue
+                # Every region has been tried, back off before trying them again
+                tried.clear()
+            if not error.retryable or attempt >= self.max_retries:
+                raise error
+            delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+            if deadline is not None:
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= delay:
+                    raise deadline.exception('backing off after {}'.format(error.code)) from error
+            self.logger.debug('Retrying request after {} in {:.3f}s'.format(error.code, delay))
+            time.sleep(delay)
+            if metrics is not None:
+                metrics.add_queue_time(delay)
+            attempt += 1
+
+    def _call_polly(self, client, parameters, deadline):
         """
+        Call SynthesizeSpeech on a helper thread, waiting for the response no longer than the deadline allows.
+        botocore cannot abort a call in progress, so an abandoned call runs on and its response is closed once it
+        arrives.
+        @param client: Polly client
+        @param parameters: SynthesizeSpeech parameters
+        @param deadline: Deadline of the call
+        @return: Polly SynthesizeSpeech response
+        """
+        if self._call_executor is None:
+            with self._executor_lock:
+                if self._call_executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._call_executor = ThreadPoolExecutor(max_workers=self.max_pool_connections,
+                                                             thread_name_prefix='pollytts-call')
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        future = self._call_executor.submit(lambda: client.synthesize_speech(**parameters))
         try:
-            response = self.client.synthesize_speech(VoiceId=self.voice,
-                                                     OutputFormat=self.output_format,
-                                                     Text=self.formatted_text,
-                                                     TextType='ssml')
+            return future.result(deadline.remaining())
+        except FutureTimeoutError:
+            if future.done():
+                return future.result()
+        future.add_done_callback(_close_abandoned)
+        raise deadline.exception('waiting for Polly')
 
-            if response['ResponseMetadata']['HTTPStatusCode'] == 200:
-                if save_to_file:
-                    file = open(os.path.join(tempfile.gettempdir(), response['ResponseMetadata']['RequestId'] + '.mp3'),
-                                'wb')
-                    file.write(response['AudioStream'].read())
-                    file.close()
-                    return file.name
-                return response['AudioStream'].read()
-        except ClientError as e:
-            raise BotoException(e.response['Error']['Code'], e.response['Error']['Message'])
+    def get_cached_audio(self, key, metrics=None):
+        """
+        Look up audio in the in-memory cache, then in the persistent cache
+        @param key: Cache key
+        @param metrics: SynthesisMetrics receiving the cache outcome. Default - None
+        @return: Cached audio bytes, None on a miss
+        """
+        audio = self.memory_cache.get(key) if self.memory_cache is not None else None
+        if metrics is not None:
+            metrics.cache = 'memory' if audio is not None else 'miss'
+        if audio is None and self.disk_cache is not None:
+            audio = self.disk_cache.get(key)
+            if audio is not None:
+                if metrics is not None:
+                    metrics.cache = 'disk'
+                if self.memory_cache is not None:
+                    self.memory_cache.put(key, audio)
+        return audio
 
-    def sent_request_stream_to_polly(self):
+    def put_cached_audio(self, key, audio):
         """
-        TODO : support audio streaming
+        Store audio in the enabled caches
+        @param key: Cache key
+        @param audio: Audio bytes
+        @return: None
         """
-        pass
+        if self.memory_cache is not None:
+            self.memory_cache.put(key, audio)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, audio)
+        return None
 
     def convert_text_to_ssml(self, text):
         """
@@ -228,48 +1266,156 @@ class PollyTTS:
         @param text: Input text to convert to SSML format
         @return: SSML formatted text
         """
-        text_formatter = []
-        text = text.strip()
-        replacement_map = {
-            '<whisper>': '<amazon:effect name="whispered">',
-            '</whisper>': '</amazon:effect>',
-            '<soft>': '<amazon:effect phonation="soft">',
-            '</soft>': '</amazon:effect>',
-            '<newscaster>': '<amazon:domain name="news">',
-            '</newscaster>': '</amazon:domain>',
-            '<convo>': '<amazon:domain name="conversational">',
-            '</convo>': '</amazon:domain>',
-            '<telephone>': '<say-as interpret-as="telephone">',
-            '</telephone>': '</say-as>',
-            '<fraction>': '<say-as interpret-as="fraction">',
-            '</fraction>': '</say-as>',
-            '<bleep>': '<say-as interpret-as="expletive">',
-            '</bleep>': '</say-as>',
-            '<address>': '<say-as interpret-as="address">',
-            '</address>': '</say-as>',
-            '<time>': '<say-as interpret-as="time">',
-            '</time>': '</say-as>',
-            '<unit>': '<say-as interpret-as="unit">',
-            '</unit>': '</say-as>',
-            '<digits>': '<say-as interpret-as="digits">',
-            '</digits>': '</say-as>',
-            '<ordinal>': '<say-as interpret-as="ordinal">',
-            '</ordinal>': '</say-as>',
-            '<number>': '<say-as interpret-as="number">',
-            '</number>': '</say-as>',
-            '<spell>': '<say-as interpret-as="spell-out">',
-            '</spell>': '</say-as>',
-            '<emphasize>': '<emphasis level="strong">',
-            '</emphasize>': '</emphasis>',
-            '<break>': '<break time="2s"/>'
-        }
+        return text_to_ssml(text)
 
-        for k, v in replacement_map.items():
-            if k in text:
-                text = text.replace(k, v)
 
-        text_formatter.append('<speak>')
-        text_formatter.append(text)
-        text_formatter.append('</speak>')
-        self.formatted_text = ''.join(text_formatter)
-        return None
+class AsyncPollyTTS:
+    """
+    asyncio API for Amazon Polly TTS services.
+
+    Validation and SSML conversion are shared with PollyTTS. Blocking calls to Polly run on the bounded thread pool
+    of the wrapped PollyTTS instance, so no thread is created per request, and the number of requests in flight is
+    limited by a semaphore. Cancelling a request closes its response body, releasing the HTTP connection.
+
+    asyncio is imported by the methods using it rather than with the module, it is already loaded whenever they run.
+    """
+
+    def __init__(self, access_key_id=None, secret_access_key=None, region='us-west-1', debug=False,
+                 max_concurrency=10, polly=None, **options):
+        """
+        Initiate class
+        @param access_key_id: AWS Polly access key id
+        @param secret_access_key: AWS Polly secret access key
+        @param region: AWS region. Default - US-WEST-1
+        @param debug: Debugging option. Default - False
+        @param max_concurrency: Maximum number of requests in flight. Default - 10
+        @param polly: Existing PollyTTS instance to use instead of creating one. Default - None
+        @param options: Further PollyTTS options (cache_dir, memory_cache_bytes...)
+        """
+        if polly is None:
+            options.setdefault('max_workers', max_concurrency)
+            polly = PollyTTS(access_key_id, secret_access_key, region=region, debug=debug, **options)
+        self.polly = polly
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # Created on first use so it binds to the running event loop
+        if self._semaphore is None:
+            import asyncio
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def speak(self, text, lang=None, voice=None, engine=None, output_format=None, save_to_file=False,
+                    text_type='text', timeout=None):
+        """
+        Generate speech without blocking the event loop. Parameters are the same as PollyTTS.speak. Cancelling the
+        task stops the request at its next step.
+        @return: If save_to_file is true - location of the audio file will be returned. If false - the audio in raw
+        byte format will be returned.
+        """
+        metrics = None
+        if self.polly.observer is None:
+            request = self.polly.prepare_request(text, lang, voice, engine, output_format, text_type)
+        else:
+            metrics = SynthesisMetrics('speak', len(text or ''))
+            request = self.polly._prepare_observed(metrics, text, lang, voice, engine, output_format, text_type)
+
+        if save_to_file:
+            import asyncio
+            loop = asyncio.get_running_loop()
+            deadline = Deadline.of(timeout) or Deadline()
+            async with self.semaphore:
+                try:
+                    return await loop.run_in_executor(self.polly.executor, self.polly.send_request_to_polly,
+                                                      request, save_to_file, metrics, deadline)
+                except BaseException as e:
+                    if isinstance(e, asyncio.CancelledError):
+                        # The request keeps running on the pool until it reaches its next step
+                        deadline.cancel()
+                    if metrics is not None:
+                        metrics.error = type(e).__name__
+                    raise
+                finally:
+                    if metrics is not None:
+                        self.polly._report(metrics)
+
+        chunks = []
+        async for chunk in self._stream(request, READ_CHUNK_SIZE, metrics, Deadline.of(timeout)):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def stream(self, text, lang=None, voice=None, engine=None, output_format=None, text_type='text',
+                     chunk_size=DEFAULT_CHUNK_SIZE, timeout=None):
+        """
+        Generate speech and receive the audio incrementally. Parameters are the same as PollyTTS.stream
+        @return: Asynchronous iterator of audio chunks
+        """
+        metrics = None
+        if self.polly.observer is None:
+            request = self.polly.prepare_request(text, lang, voice, engine, output_format, text_type)
+        else:
+            metrics = SynthesisMetrics('stream', len(text or ''))
+            request = self.polly._prepare_observed(metrics, text, lang, voice, engine, output_format, text_type)
+
+        async for chunk in self._stream(request, chunk_size, metrics, Deadline.of(timeout)):
+            yield chunk
+
+    async def _stream(self, request, chunk_size, metrics=None, deadline=None):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            opening = loop.run_in_executor(self.polly.executor, self.polly.sent_request_stream_to_polly, request,
+                                           chunk_size, metrics, deadline)
+            try:
+                audio = await asyncio.shield(opening)
+            except asyncio.CancelledError:
+                # The request is already running on the pool, stop it at its next step and release its connection
+                # as soon as it returns
+                if deadline is not None:
+                    deadline.cancel()
+                opening.add_done_callback(_close_stream)
+                raise
+
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(self.polly.executor, next, audio, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                audio.close()
+
+    async def warm(self, n_connections=1):
+        """
+        Open connections to Polly without blocking the event loop. Parameters are the same as PollyTTS.warm
+        @return: Number of connections opened
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.polly.warm, n_connections)
+
+    async def close(self):
+        """
+        Release resources held by the instance
+        @return: None
+        """
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, self.polly.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+def _close_stream(future):
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().close()
+
+
+def _close_abandoned(future):
+    # Response to a call given up at its deadline
+    if not future.cancelled() and future.exception() is None:
+        future.result()['AudioStream'].close()
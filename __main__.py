@@ -0,0 +1,325 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+
+"""
+
+Bulk synthesis from a manifest
+
+Reads a JSONL or CSV manifest with one prompt per line or row. Fields are id, text and, optionally, lang, voice,
+engine, format and text_type. Fields missing from a prompt take the values given on the command line. Every prompt is
+written to <output dir>/<id><extension>. The outcome of every prompt is appended to a results manifest as soon as
+it is known. Prompts already recorded as done there are skipped when the command is run again, so an interrupted
+run is resumed by running the same command.
+
+python pollytts prompts.jsonl --output-dir audio --workers 32
+python pollytts prompts.csv --output-dir audio --voice Matthew --processes 4 --workers 16
+
+Credentials are taken from --access-key-id and --secret-access-key, then from AWS_ACCESS_KEY_ID and
+AWS_SECRET_ACCESS_KEY, then from the default boto3 credential chain.
+
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from __init__ import PollyTTS
+from RateLimiter import RateLimiter, DEFAULT_RATES
+from Splitter import MAX_REQUEST_CHARS
+from Streaming import FILE_EXTENSIONS, write_file
+
+FIELDS = ('id', 'text', 'lang', 'voice', 'engine', 'format', 'text_type')
+
+# Prompts submitted ahead of the workers, and sent to a worker process at once
+PENDING_PER_WORKER = 2
+PROCESS_BATCH_SIZE = 64
+
+_UNSAFE = re.compile(r'[^\w.-]')
+
+# PollyTTS of a worker process
+_worker = None
+
+
+def read_manifest(path, manifest_format=None):
+    """
+    Prompts of a manifest
+    @param path: JSONL or CSV file
+    @param manifest_format: jsonl or csv. Default - None (from the file extension, JSONL unless .csv)
+    @return: Iterator of dictionaries with string ids
+    """
+    if manifest_format is None:
+        manifest_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    with open(path, newline='' if manifest_format == 'csv' else None, encoding='utf-8') as file:
+        rows = csv.DictReader(file) if manifest_format == 'csv' else \
+            (json.loads(line) for line in file if line.strip())
+        for number, row in enumerate(rows, 1):
+            if row.get('id') in (None, '') or not row.get('text'):
+                raise ValueError("Prompt {} of {} needs an id and a text".format(number, path))
+            row['id'] = str(row['id'])
+            yield row
+
+
+def read_done(path):
+    """
+    Ids recorded as done in a results manifest
+    @param path: Results manifest
+    @return: Set of ids
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # Line cut short by an interrupted run
+                continue
+            if result.get('status') == 'done':
+                done.add(result['id'])
+    return done
+
+
+def file_name(prompt_id):
+    """
+    File name for an id, unchanged when it is safe to use, otherwise made safe and suffixed with a hash of the id
+    so different ids never share a file
+    """
+    name = _UNSAFE.sub('_', prompt_id)
+    if name != prompt_id or name.startswith('.'):
+        name = '{}-{}'.format(name.lstrip('.'), hashlib.sha1(prompt_id.encode('utf-8')).hexdigest()[:10])
+    return name
+
+
+def synthesize(polly, prompt, options):
+    """
+    Synthesize one prompt into its file
+    @param polly: PollyTTS instance
+    @param prompt: Dictionary of the prompt fields
+    @param options: Parsed command line arguments
+    @return: Result dictionary, with status done or failed
+    """
+    started = time.perf_counter()
+    output_format = prompt.get('format') or options.format
+    path = os.path.join(options.output_dir, file_name(prompt['id']) + FILE_EXTENSIONS.get(output_format,
+                                                                                          '.' + output_format))
+    arguments = dict(lang=prompt.get('lang') or options.lang, voice=prompt.get('voice') or options.voice,
+                     engine=prompt.get('engine') or options.engine, output_format=output_format,
+                     text_type=prompt.get('text_type') or options.text_type)
+    text = prompt['text']
+    speak = polly.speak_long if len(text) > MAX_REQUEST_CHARS else polly.speak
+    try:
+        write_file(path, lambda file: speak(text, save_to_file=file, **arguments))
+        size = os.path.getsize(path)
+    except Exception as e:
+        return {'id': prompt['id'], 'status': 'failed', 'error': '{}: {}'.format(type(e).__name__, e),
+                'chars': len(text), 'seconds': round(time.perf_counter() - started, 3)}
+    return {'id': prompt['id'], 'status': 'done', 'path': path, 'bytes': size, 'chars': len(text),
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def create_polly(options, processes=1):
+    """
+    PollyTTS instance for the command line options. The client side rate limits are shared out between processes.
+    """
+    rates = {engine: (rate / processes, max(1, burst // processes)) for engine, (rate, burst) in DEFAULT_RATES.items()}
+    return PollyTTS(options.access_key_id or os.environ.get('AWS_ACCESS_KEY_ID'),
+                    options.secret_access_key or os.environ.get('AWS_SECRET_ACCESS_KEY'),
+                    region=options.region, cache_dir=options.cache_dir, max_workers=options.workers,
+                    rate_limiter=RateLimiter(rates), max_retries=options.max_retries)
+
+
+class Progress:
+    """
+    Counts of finished prompts, printed periodically with the throughput
+    """
+
+    def __init__(self, total, skipped, interval, stream=sys.stderr):
+        self.total = total
+        self.skipped = skipped
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.chars = 0
+        self.started = time.monotonic()
+        self._printed = self.started
+
+    def add(self, result):
+        if result['status'] == 'done':
+            self.done += 1
+            self.chars += result['chars']
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self._printed >= self.interval:
+            self._printed = now
+            self.report(now)
+
+    def report(self, now=None):
+        elapsed = max((now or time.monotonic()) - self.started, 1e-9)
+        finished = self.done + self.failed
+        rate = finished / elapsed
+        line = '{}/{} prompts ({} skipped, {} failed) {:.1f} prompts/s {:.0f} chars/s'.format(
+            finished + self.skipped, self.total, self.skipped, self.failed, rate, self.chars / elapsed)
+        remaining = self.total - self.skipped - finished
+        if rate > 0 and remaining > 0:
+            line += ' eta {:.0f}s'.format(remaining / rate)
+        self.stream.write(line + '\n')
+        self.stream.flush()
+
+
+def run_threads(prompts, options, record):
+    """
+    Synthesize prompts on a pool of threads in this process
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    polly = create_polly(options)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=options.workers, thread_name_prefix='pollytts-cli') as executor:
+        try:
+            for prompt in prompts:
+                if len(pending) >= options.workers * PENDING_PER_WORKER:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record(future.result())
+                pending.add(executor.submit(synthesize, polly, prompt, options))
+            for future in wait(pending)[0]:
+                record(future.result())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            polly.close()
+
+
+def _init_worker(options):
+    global _worker
+    _worker = (create_polly(options, options.processes), options)
+
+
+def _synthesize_batch(prompts):
+    from concurrent.futures import ThreadPoolExecutor
+
+    polly, options = _worker
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        return list(executor.map(lambda prompt: synthesize(polly, prompt, options), prompts))
+
+
+def run_processes(prompts, options, record):
+    """
+    Synthesize prompts in worker processes, each with its own pool of threads
+    """
+    import multiprocessing
+
+    def batches():
+        batch = []
+        for prompt in prompts:
+            batch.append(prompt)
+            if len(batch) == PROCESS_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    with multiprocessing.Pool(options.processes, _init_worker, (options,)) as pool:
+        for results in pool.imap_unordered(_synthesize_batch, batches()):
+            for result in results:
+                record(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pollytts', description='Synthesize the prompts of a manifest with Polly')
+    parser.add_argument('manifest', help='JSONL or CSV file of prompts with id, text and optionally lang, voice, '
+                                         'engine, format and text_type')
+    parser.add_argument('--manifest-format', choices=['jsonl', 'csv'], help='default - from the file extension')
+    parser.add_argument('--output-dir', required=True, help='directory receiving the audio files')
+    parser.add_argument('--results', help='results manifest, default - results.jsonl in the output directory')
+    parser.add_argument('--workers', type=int, default=10, help='concurrent requests per process')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes')
+    parser.add_argument('--lang', help='language of prompts without one')
+    parser.add_argument('--voice', help='voice of prompts without one')
+    parser.add_argument('--engine', help='engine of prompts without one')
+    parser.add_argument('--format', default='mp3', choices=['mp3', 'ogg_vorbis', 'pcm', 'json'],
+                        help='output format of prompts without one')
+    parser.add_argument('--text-type', default='text', choices=['text', 'ssml'], help='type of prompts without one')
+    parser.add_argument('--region', default='us-west-1')
+    parser.add_argument('--access-key-id')
+    parser.add_argument('--secret-access-key')
+    parser.add_argument('--cache-dir', help='persistent audio cache shared between runs')
+    parser.add_argument('--max-retries', type=int, default=5, help='retries of throttled or failed requests')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='seconds between progress lines')
+    parser.add_argument('--no-resume', action='store_true', help='synthesize prompts already recorded as done')
+    options = parser.parse_args(argv)
+
+    os.makedirs(options.output_dir, exist_ok=True)
+    results_path = options.results or os.path.join(options.output_dir, 'results.jsonl')
+    done = set() if options.no_resume else read_done(results_path)
+
+    # The manifest is checked in full before the first request
+    total = skipped = 0
+    try:
+        for prompt in read_manifest(options.manifest, options.manifest_format):
+            total += 1
+            skipped += prompt['id'] in done
+    except ValueError as e:
+        parser.error(str(e))
+
+    prompts = (prompt for prompt in read_manifest(options.manifest, options.manifest_format)
+               if prompt['id'] not in done)
+    progress = Progress(total, skipped, options.progress_interval)
+    lock = threading.Lock()
+
+    with open(results_path, 'a', encoding='utf-8') as results:
+        def record(result):
+            with lock:
+                # One line per prompt, flushed at once so an interrupted run loses nothing it finished
+                results.write(json.dumps(result) + '\n')
+                results.flush()
+                progress.add(result)
+
+        try:
+            if options.processes > 1:
+                run_processes(prompts, options, record)
+            else:
+                run_threads(prompts, options, record)
+        except KeyboardInterrupt:
+            progress.report()
+            sys.stderr.write('Interrupted, run the same command again to resume\n')
+            return 130
+
+    progress.report()
+    return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
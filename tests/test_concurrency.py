@@ -0,0 +1,153 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+"""
+
+Concurrency stress test of the request path
+
+Many threads share one PollyTTS instance, each sending requests with different languages, voices, engines and
+output formats. Every request must reach Polly with its own parameters and every caller must receive the audio
+of its own request.
+
+python -m unittest discover tests
+
+"""
+
+import os
+import re
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmark import FakePollyClient  # noqa: E402
+from __init__ import PollyTTS  # noqa: E402
+
+# Language, voice, engine and output format of the requests, sent interleaved from every thread
+COMBINATIONS = (
+    ('en-US', 'Joanna', 'neural', 'mp3'),
+    ('en-GB', 'Amy', 'standard', 'ogg_vorbis'),
+    ('fr-FR', 'Celine', 'standard', 'pcm'),
+    ('de-DE', 'Hans', 'standard', 'mp3'),
+    ('es-ES', 'Conchita', 'standard', 'pcm'),
+    ('ja-JP', 'Mizuki', 'standard', 'mp3')
+)
+
+THREADS = 16
+REQUESTS_PER_THREAD = 60
+
+
+class CheckingClient(FakePollyClient):
+    """
+    Fake client recording requests whose parameters are not those of the combination named in their text
+    """
+
+    def __init__(self, audio_bytes=256, latency=0.001):
+        super(CheckingClient, self).__init__(audio_bytes, latency)
+        self.mismatches = []
+
+    def synthesize_speech(self, **params):
+        number = int(re.search(r'combination (\d+)', params['Text']).group(1))
+        _, voice, engine, output_format = COMBINATIONS[number]
+        if (params['VoiceId'], params['Engine'], params['OutputFormat']) != (voice, engine, output_format):
+            with self._lock:
+                self.mismatches.append(params)
+        return super(CheckingClient, self).synthesize_speech(**params)
+
+
+def expected_prefix(text, voice):
+    return '{}|<speak>{}</speak>|'.format(voice, text).encode('utf-8')
+
+
+class SharedInstanceTest(unittest.TestCase):
+
+    def stress(self, polly, texts_for):
+        """
+        Call speak from many threads at once
+        @param polly: Shared PollyTTS instance
+        @param texts_for: Callable returning the text of a thread and request number
+        @return: List of texts whose caller received the wrong audio or an exception
+        """
+        start = threading.Barrier(THREADS)
+        failures = []
+
+        def work(thread):
+            start.wait()
+            for index in range(REQUESTS_PER_THREAD):
+                number = (thread + index) % len(COMBINATIONS)
+                lang, voice, engine, output_format = COMBINATIONS[number]
+                text = texts_for(thread, index, number)
+                try:
+                    audio = polly.speak(text, lang, voice, engine, output_format)
+                except Exception as e:
+                    failures.append((text, e))
+                    continue
+                if not bytes(audio).startswith(expected_prefix(text, voice)):
+                    failures.append((text, bytes(audio[:80])))
+
+        threads = [threading.Thread(target=work, args=(thread,)) for thread in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return failures
+
+    def test_distinct_requests(self):
+        client = CheckingClient()
+        polly = PollyTTS('test', 'test', client=client, rate_limiter=None, coalesce=False,
+                         max_workers=THREADS)
+        failures = self.stress(polly, lambda thread, index, number: 'thread {} request {} combination {}'.format(
+            thread, index, number))
+        self.assertEqual(failures, [])
+        self.assertEqual(client.mismatches, [])
+        self.assertEqual(client.calls, THREADS * REQUESTS_PER_THREAD)
+
+    def test_shared_cache_and_coalescing(self):
+        # Threads send the same texts, so requests are served from the cache and share calls in flight
+        client = CheckingClient()
+        polly = PollyTTS('test', 'test', client=client, rate_limiter=None, coalesce=True,
+                         memory_cache_bytes=1024 * 1024, max_workers=THREADS)
+        failures = self.stress(polly, lambda thread, index, number: 'request {} combination {}'.format(
+            index % 10, number))
+        self.assertEqual(failures, [])
+        self.assertEqual(client.mismatches, [])
+        self.assertLess(client.calls, THREADS * REQUESTS_PER_THREAD)
+
+    def test_speak_many(self):
+        client = CheckingClient()
+        polly = PollyTTS('test', 'test', client=client, rate_limiter=None, max_workers=THREADS)
+        items = []
+        for index in range(300):
+            number = index % len(COMBINATIONS)
+            lang, voice, engine, output_format = COMBINATIONS[number]
+            items.append({'text': 'item {} combination {}'.format(index, number), 'lang': lang, 'voice': voice,
+                          'engine': engine, 'output_format': output_format})
+        results = polly.speak_many(items, max_workers=THREADS)
+        for item, audio in zip(items, results):
+            self.assertTrue(bytes(audio).startswith(expected_prefix(item['text'], item['voice'])))
+        self.assertEqual(client.mismatches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
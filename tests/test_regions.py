@@ -0,0 +1,66 @@
+#  MIT License
+#
+#  Copyright (c) [year] [fullname]
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+
+
+"""
+
+Routing between regions
+
+Latency recorded for a region must be that of the region, not of the time requests spent waiting locally for the
+scheduler or the rate limiter.
+
+python -m unittest discover tests
+
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmark import FakePollyClient  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+from __init__ import PollyTTS  # noqa: E402
+
+LATENCY = 0.05
+
+
+class RegionLatencyTest(unittest.TestCase):
+
+    def test_local_queueing_is_not_region_latency(self):
+        # Requests queue for a single scheduler slot, so most of their time is spent waiting locally
+        clients = {'us-east-1': FakePollyClient(256, LATENCY), 'us-west-2': FakePollyClient(256, LATENCY)}
+        polly = PollyTTS('test', 'test', region='us-east-1', regions=['us-west-2'], client=clients,
+                         rate_limiter=None, coalesce=False, scheduler=Scheduler(max_concurrency=1), max_workers=16)
+        results = polly.speak_many(['request {}'.format(index) for index in range(16)])
+        self.assertFalse([result for result in results if isinstance(result, Exception)])
+
+        latencies = [stats['latency'] for stats in polly.region_pool.snapshot().values()]
+        for latency in latencies:
+            self.assertLess(latency, LATENCY * 1.6)
+        self.assertLess(max(latencies) / min(latencies), 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()